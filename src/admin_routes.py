@@ -0,0 +1,66 @@
+import hmac
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
+
+from .profiling import profiler
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+# unset = admin endpoints are off entirely
+ADMIN_TOKEN = os.environ.get("TEORIAT_ADMIN_TOKEN", "")
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # compare raw bytes: compare_digest raises TypeError on non-ASCII str, and the
+    # server decodes header bytes as latin-1, so that round-trips what was sent
+    sent = (x_admin_token or "").encode("latin-1", errors="replace")
+    if not sent or not hmac.compare_digest(sent, ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+class ArmRequest(BaseModel):
+    requests: int | None = 200
+    seconds: float | None = 60.0
+    interval_ms: float = 2.0
+    torch: bool = True
+
+
+@router.post("/profile", dependencies=[Depends(require_admin)])
+def arm_profiler(req: ArmRequest):
+    if not req.requests and not req.seconds:
+        raise HTTPException(status_code=422, detail="Set requests and/or seconds")
+    profiler.arm(
+        requests=req.requests,
+        seconds=req.seconds,
+        interval=req.interval_ms / 1000,
+        torch_enabled=req.torch,
+    )
+    return profiler.status()
+
+
+@router.delete("/profile", dependencies=[Depends(require_admin)])
+def disarm_profiler():
+    profiler.disarm()
+    return profiler.status()
+
+
+@router.get("/profile", dependencies=[Depends(require_admin)])
+def profiler_status():
+    return profiler.status()
+
+
+@router.get("/profile/flamegraph", dependencies=[Depends(require_admin)])
+def profiler_output(format: str = "collapsed"):
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    if format == "speedscope":
+        return JSONResponse(
+            profiler.speedscope(),
+            headers={"Content-Disposition": 'attachment; filename="move.speedscope.json"'},
+        )
+    raise HTTPException(status_code=422, detail="format must be collapsed or speedscope")
@@ -0,0 +1,156 @@
+"""Admission control for /move
+
+Move planning runs on a small worker pool, so the event loop stays free to
+count what is queued and to answer 503 quickly. Each request is admitted at
+the cheapest quality tier that is predicted to meet its mode's latency budget
+given the work already in flight:
+
+    predicted = (in_flight / workers + 1) * cost[tier]
+
+where cost[tier] is a moving average of measured planning time at that tier,
+seeded by calibrate() at startup. Only requests that ran the model are
+measured; book and warm-cache hits say nothing about a tier's cost. A tier
+not measured yet costs what the nearest more expensive measured tier does,
+or PRIOR_COST_SECONDS, never zero.
+
+A mode whose recent p95 is over budget is served at least one tier down.
+The last tier answers without the model and is reserved for real overload:
+below FALLBACK_LOAD x max_in_flight the cheapest model tier serves even when
+it is predicted to miss the budget. Requests are rejected (503 +
+Retry-After) only when in_flight reaches the hard cap.
+"""
+
+import math
+import os
+import threading
+from collections import Counter, deque
+
+from .stats import percentile
+
+# per-mode budget for queueing + planning, excluding the artificial think delay
+SLO_SECONDS = {"bullet": 0.20, "rapid": 0.60}
+DEFAULT_SLO_SECONDS = 0.40
+EWMA_ALPHA = 0.1
+RECENT_WINDOW = 200
+PRIOR_COST_SECONDS = 0.05  # a deliberately slow guess for a tier with no measurement
+FALLBACK_LOAD = 0.75  # fraction of max_in_flight before the no-model tier is used
+
+
+def _slo_from_env() -> dict[str, float]:
+    # TEORIAT_SLO_MS="bullet=150,rapid=500"
+    slo = dict(SLO_SECONDS)
+    for item in filter(None, os.environ.get("TEORIAT_SLO_MS", "").split(",")):
+        mode, _, ms = item.partition("=")
+        slo[mode.strip()] = float(ms) / 1000
+    return slo
+
+
+class AdmissionController:
+    """tier_names run from full quality down; the last one is the no-model fallback"""
+
+    def __init__(
+        self,
+        tier_names: list[str],
+        workers: int,
+        max_in_flight: int,
+        slo: dict[str, float] | None = None,
+        enabled: bool = True,
+        prior_cost: float = PRIOR_COST_SECONDS,
+        fallback_load: float = FALLBACK_LOAD,
+    ):
+        self.tier_names = tier_names
+        self.workers = max(1, workers)
+        self.max_in_flight = max_in_flight
+        self.slo = slo if slo is not None else _slo_from_env()
+        self.enabled = enabled
+        self.prior_cost = prior_cost
+        self.fallback_load = fallback_load
+        self.in_flight = 0
+        self.cost: list[float | None] = [None] * len(tier_names)  # None = not measured yet
+        self.mean_cost = prior_cost
+        self.recent: dict[str, deque[float]] = {}
+        self.served: Counter[str] = Counter()
+        self.shed = 0
+        # release() runs on the worker thread that finished the planning
+        self._lock = threading.Lock()
+
+    def budget(self, mode: str) -> float:
+        return self.slo.get(mode, DEFAULT_SLO_SECONDS)
+
+    def tier_cost(self, tier: int) -> float:
+        for t in range(tier, -1, -1):
+            if self.cost[t] is not None:
+                return self.cost[t]
+        return self.prior_cost
+
+    def calibrate(self, costs: dict[int, float]):
+        """Seed tier costs (tier index -> seconds), e.g. timed at startup; starts a fresh latency window"""
+        with self._lock:
+            for tier, cost in costs.items():
+                self.cost[tier] = cost
+            self.recent.clear()
+            self.mean_cost = max(costs.values(), default=self.mean_cost)
+
+    def admit(self, mode: str) -> int | None:
+        """Tier index to serve at, or None to shed. Pair every admitted request with release()"""
+        with self._lock:
+            if not self.enabled:
+                self.in_flight += 1
+                return 0
+            if self.in_flight >= self.max_in_flight:
+                self.shed += 1
+                return None
+
+            budget = self.budget(mode)
+            queued = self.in_flight / self.workers
+            fallback = len(self.tier_names) - 1
+            tier = fallback - 1
+            for t in range(fallback):
+                if (queued + 1) * self.tier_cost(t) <= budget:
+                    tier = t
+                    break
+
+            recent = self.recent.get(mode)
+            if recent and percentile(list(recent), 95) > budget:
+                tier = min(max(tier, 1), fallback - 1)
+            if tier == fallback - 1 and self.in_flight >= self.fallback_load * self.max_in_flight:
+                tier = fallback
+
+            self.in_flight += 1
+            return tier
+
+    def release(self, mode: str, tier: int, latency: float, cost: float | None):
+        """latency = admit to done (includes queueing), cost = planning time, None if the model didn't run"""
+        with self._lock:
+            self.in_flight -= 1
+            if cost is not None:
+                old = self.cost[tier]
+                self.cost[tier] = cost if old is None else old + EWMA_ALPHA * (cost - old)
+                self.mean_cost += EWMA_ALPHA * (cost - self.mean_cost)
+            self.recent.setdefault(mode, deque(maxlen=RECENT_WINDOW)).append(latency)
+            self.served[self.tier_names[tier]] += 1
+
+    def abandon(self):
+        """An admitted request failed before it could be measured"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.in_flight * self.mean_cost / self.workers))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "workers": self.workers,
+                "slo_ms": {m: s * 1000 for m, s in self.slo.items()},
+                "tier_cost_ms": {
+                    n: self.tier_cost(t) * 1000 for t, n in enumerate(self.tier_names[:-1])
+                },
+                "measured_tiers": [n for n, c in zip(self.tier_names, self.cost) if c is not None],
+                "recent_p95_ms": {m: percentile(list(r), 95) * 1000 for m, r in self.recent.items() if r},
+                "served": dict(self.served),
+                "shed": self.shed,
+            }
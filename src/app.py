@@ -3,9 +3,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from pathlib import Path
 import json
+import logging
+import os
 import random
+import re
 import asyncio
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
 
 import chess
 import chess.polyglot
@@ -13,18 +19,31 @@ import torch
 
 from .db import create_db_and_tables
 from .leaderboard_routes import router as leaderboardrouter
+from .export_routes import router as exportrouter
+from .admin_routes import router as adminrouter
 from . import models
+from .position_token import decode_token, encode_token
+from .profiling import profiler
+from .registry import ModelRegistry
+from .admission import AdmissionController
+from .features import attacks_for_dim, encode_boards
+from .warm_cache import WarmCache
+from .transformer import ChessTransformer, KVSessions, transformer_from_state
 
 app = FastAPI(title="TEORIAT Chess Engine API")
+logger = logging.getLogger("uvicorn.error")
 
 
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
+    calibrate_admission()
 
 
 # IMPORTANT: use the same name you imported (leaderboardrouter)
 app.include_router(leaderboardrouter)
+app.include_router(exportrouter)
+app.include_router(adminrouter)
 
 
 app.add_middleware(
@@ -47,6 +66,9 @@ MAX_SEQ_LEN = 6
 # candidate generation
 TOPK = 120
 
+# scales the artificial "thinking" delay; load tests set this to 0
+THINK_TIME_SCALE = float(os.environ.get("TEORIAT_THINK_SCALE", "1.0"))
+
 # sampling + "style"
 TEMPERATURE = 0.90
 STYLE_SAMPLE_K = 8
@@ -79,6 +101,48 @@ MODEL_LOGPROB_WEIGHT = 1.0
 HEURISTIC_WEIGHT = 0.35
 
 
+@dataclass(frozen=True)
+class EngineParams:
+    # tunable knobs of pick_legal_move; defaults are the serving values above
+    topk: int = TOPK
+    temperature: float = TEMPERATURE
+    style_sample_k: int = STYLE_SAMPLE_K
+    w_check: float = W_CHECK
+    w_hang: float = W_HANG
+    w_hang_net: float = W_HANG_NET
+    w_worst_reply: float = W_WORST_REPLY
+    heuristic_weight: float = HEURISTIC_WEIGHT
+    # cheaper quality tiers under load (see QUALITY_TIERS)
+    deep_heuristics: bool = True  # moved_piece_net_loss + worst_reply_capture_loss
+    heuristics: bool = True  # False = model ranking only
+
+
+DEFAULT_PARAMS = EngineParams()
+
+# fingerprint of everything score_candidates depends on besides the model;
+# warm-start caches built under other values are ignored
+SCORING_VERSION = zlib.crc32(
+    json.dumps(
+        {
+            "params": asdict(DEFAULT_PARAMS),
+            "piece_value": PIECE_VALUE,
+            "weights": [W_CAPTURE, W_ATTACKED, W_REPETITION_2, W_REPETITION_3, MODEL_LOGPROB_WEIGHT],
+        },
+        sort_keys=True,
+    ).encode("utf-8")
+)
+
+# served cheapest-last as load rises; None = book or a random legal move, no model
+REDUCED_TOPK = 32
+QUALITY_TIERS: tuple[tuple[str, EngineParams | None], ...] = (
+    ("full", DEFAULT_PARAMS),
+    ("reduced_topk", replace(DEFAULT_PARAMS, topk=REDUCED_TOPK)),
+    ("light_heuristics", replace(DEFAULT_PARAMS, topk=REDUCED_TOPK, deep_heuristics=False)),
+    ("model_only", replace(DEFAULT_PARAMS, topk=REDUCED_TOPK, heuristics=False)),
+    ("fallback", None),
+)
+
+
 class ChessRNN(torch.nn.Module):
     def __init__(
         self,
@@ -87,13 +151,20 @@ class ChessRNN(torch.nn.Module):
         hidden_dim=HIDDEN_DIM,
         num_layers=NUM_LAYERS,
         dropout=DROPOUT,
+        side_dim=32,
+        intermediate=True,
+        head_rank=None,
+        board_features=0,
     ):
+        # defaults are the serving (teacher) model; distilled students shrink the
+        # dims, drop fc_intermediate and factorize the output head through head_rank.
+        # board_features > 0 adds the features.py board encoding as a fourth input
         super().__init__()
         self.move_embedding = torch.nn.Embedding(vocab_size, embedding_dim, padding_idx=PAD_TOKEN)
-        self.color_embedding = torch.nn.Embedding(2, 32)
-        self.theory_embedding = torch.nn.Embedding(2, 32)
+        self.color_embedding = torch.nn.Embedding(2, side_dim)
+        self.theory_embedding = torch.nn.Embedding(2, side_dim)
 
-        input_dim = embedding_dim + 32 + 32
+        input_dim = embedding_dim + 2 * side_dim
         self.layer_norm = torch.nn.LayerNorm(input_dim)
 
         self.rnn = torch.nn.GRU(
@@ -105,11 +176,14 @@ class ChessRNN(torch.nn.Module):
         )
 
         self.dropout = torch.nn.Dropout(dropout)
-        self.fc_intermediate = torch.nn.Linear(hidden_dim, hidden_dim)
+        self.fc_intermediate = torch.nn.Linear(hidden_dim, hidden_dim) if intermediate else None
         self.relu = torch.nn.ReLU()
-        self.fc = torch.nn.Linear(hidden_dim, vocab_size)
+        self.fc_low = torch.nn.Linear(hidden_dim, head_rank, bias=False) if head_rank else None
+        self.fc = torch.nn.Linear(head_rank or hidden_dim, vocab_size)
+        self.board_proj = torch.nn.Linear(board_features, hidden_dim) if board_features else None
+        self.board_attacks = attacks_for_dim(board_features) if board_features else False
 
-    def forward(self, colors, moves, theory):
+    def forward(self, colors, moves, theory, boards=None):
         move_embedded = self.move_embedding(moves)
         color_embedded = self.color_embedding(colors)
         theory_embedded = self.theory_embedding(theory)
@@ -119,41 +193,217 @@ class ChessRNN(torch.nn.Module):
 
         _, hidden_state = self.rnn(combined)
         last_hidden = hidden_state[-1, :, :]
+        if self.board_proj is not None:
+            last_hidden = last_hidden + self.relu(self.board_proj(boards.float()))
 
         x = self.dropout(last_hidden)
-        x = self.fc_intermediate(x)
-        x = self.relu(x)
-        x = self.dropout(x)
+        if self.fc_intermediate is not None:
+            x = self.fc_intermediate(x)
+            x = self.relu(x)
+            x = self.dropout(x)
+        if self.fc_low is not None:
+            x = self.fc_low(x)
         return self.fc(x)
 
 
-BASE_DIR = Path(__file__).resolve().parent
-MOVE_TO_NUMBER_PATH = BASE_DIR / "move_to_number.json"
-MODEL_PATH = BASE_DIR / "best_chess_model.pth"
-BOOK_PATH = BASE_DIR / "book.bin"
+def model_from_state(state: dict) -> "ChessRNN | ChessTransformer":
+    """Rebuild the model a saved state_dict describes: ChessRNN of any shape, or ChessTransformer"""
+    if "pos_embedding.weight" in state:
+        return transformer_from_state(state, PAD_TOKEN).to(device)
+    head_rank = state["fc_low.weight"].shape[0] if "fc_low.weight" in state else None
+    net = ChessRNN(
+        vocab_size=state["fc.weight"].shape[0],
+        embedding_dim=state["move_embedding.weight"].shape[1],
+        hidden_dim=state["rnn.weight_hh_l0"].shape[1],
+        num_layers=sum(1 for k in state if k.startswith("rnn.weight_hh_l")),
+        side_dim=state["color_embedding.weight"].shape[1],
+        intermediate="fc_intermediate.weight" in state,
+        head_rank=head_rank,
+        board_features=state["board_proj.weight"].shape[1] if "board_proj.weight" in state else 0,
+    ).to(device)
+    net.load_state_dict(state)
+    net.eval()
+    return net
 
-if not MOVE_TO_NUMBER_PATH.exists():
-    raise RuntimeError(f"Missing file: {MOVE_TO_NUMBER_PATH}")
-if not MODEL_PATH.exists():
-    raise RuntimeError(f"Missing file: {MODEL_PATH}")
 
-with MOVE_TO_NUMBER_PATH.open("r", encoding="utf-8") as f:
-    move_to_number = json.load(f)
+def context_len_for(net: "ChessRNN | ChessTransformer") -> int:
+    """Plies of history the model reads: the whole game for a transformer"""
+    return net.max_len if isinstance(net, ChessTransformer) else MAX_SEQ_LEN
 
-number_to_move = {int(v): k for k, v in move_to_number.items()}
 
-model = ChessRNN().to(device)
-model.load_state_dict(torch.load(MODEL_PATH, map_location=device))
-model.eval()
+BASE_DIR = Path(__file__).resolve().parent
+MOVE_TO_NUMBER_PATH = BASE_DIR / "move_to_number.json"
+MODEL_PATH = BASE_DIR / "best_chess_model.pth"
+BOOK_PATH = BASE_DIR / "book.bin"
+# optional distilled model (python -m src.distill); absent = teacher serves every mode
+STUDENT_MODEL_PATH = BASE_DIR / "student_chess_model.pth"
+STUDENT_MODES = set(filter(None, os.environ.get("TEORIAT_STUDENT_MODES", "bullet").split(",")))
+# optional precomputed decisions for frequent positions (python -m src.warm_cache)
+WARM_CACHE_PATH = BASE_DIR / "warm_cache.bin"
+# per-game key/value caches for transformer profiles
+KV_CACHE_BYTES = int(float(os.environ.get("TEORIAT_KV_CACHE_MB", "128")) * 1024 * 1024)
+
+# other players live in profiles/<name>/ with the same three files
+PROFILES_DIR = BASE_DIR / "profiles"
+DEFAULT_PROFILE = "teoriat"
+PROFILE_NAME_RE = re.compile(r"^[a-z0-9_-]{1,40}$")
+REGISTRY_MAX_BYTES = int(float(os.environ.get("TEORIAT_REGISTRY_MB", "512")) * 1024 * 1024)
+# a profile that failed to load answers 503 from memory for this long before the next attempt
+PROFILE_RETRY_SECONDS = float(os.environ.get("TEORIAT_PROFILE_RETRY_SECONDS", "30"))
+
+
+@dataclass
+class Profile:
+    name: str
+    model: ChessRNN | ChessTransformer
+    move_to_number: dict[str, int]
+    number_to_move: dict[int, str]
+    book_path: Path
+    vocab_version: int  # crc32 of the vocab; position tokens are bound to it
+    student: ChessRNN | None = None  # distilled model served for STUDENT_MODES
+    weights_version: int = 0  # crc32 of the weights file
+    warm_cache: WarmCache | None = None
+    context_len: int = MAX_SEQ_LEN  # plies in the model window (a transformer sees the whole game)
+    sessions: KVSessions | None = None  # transformer only
+
+
+def load_profile_files(
+    name: str,
+    model_path: Path,
+    vocab_path: Path,
+    book_path: Path,
+    student_path: Path | None = None,
+    cache_path: Path | None = None,
+) -> Profile:
+    if not vocab_path.exists():
+        raise FileNotFoundError(f"Missing file: {vocab_path}")
+    if not model_path.exists():
+        raise FileNotFoundError(f"Missing file: {model_path}")
+
+    with vocab_path.open("r", encoding="utf-8") as f:
+        vocab = json.load(f)
+
+    # fine-tuned checkpoints may have grown the vocab past VOCAB_SIZE (ids are append-only)
+    net = model_from_state(torch.load(model_path, map_location=device))
+    vocab_version = zlib.crc32(json.dumps(vocab, sort_keys=True).encode("utf-8"))
+    weights_version = zlib.crc32(model_path.read_bytes())
+
+    student = None
+    if student_path is not None and student_path.exists():
+        # distill writes the teacher's weights_version next to the student
+        meta_path = student_path.with_suffix(".json")
+        meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+        if meta.get("teacher_weights_version") != weights_version:
+            logger.warning("Ignoring student %s (not distilled from the current %s)", student_path, model_path)
+        else:
+            student = model_from_state(torch.load(student_path, map_location=device))
+            if student.fc.out_features != net.fc.out_features:
+                raise ValueError(f"{student_path} was distilled for a different vocab than {model_path}")
+    warm_cache = None
+    if cache_path is not None and cache_path.exists():
+        warm_cache = WarmCache(cache_path)
+        if not warm_cache.matches(vocab_version, weights_version, SCORING_VERSION):
+            logger.warning("Ignoring stale warm cache %s (built for other weights or scoring)", cache_path)
+            warm_cache = None
+
+    return Profile(
+        name=name,
+        model=net,
+        move_to_number=vocab,
+        number_to_move={int(v): k for k, v in vocab.items()},
+        book_path=book_path,
+        vocab_version=vocab_version,
+        student=student,
+        weights_version=weights_version,
+        warm_cache=warm_cache,
+        context_len=context_len_for(net),
+        sessions=KVSessions(net, KV_CACHE_BYTES) if isinstance(net, ChessTransformer) else None,
+    )
+
+
+class ProfileLoadError(Exception):
+    """A profile's files exist but do not load: corrupt, or weights that don't fit the vocab"""
+
+
+def load_profile(name: str) -> Profile:
+    if not PROFILE_NAME_RE.match(name):
+        raise FileNotFoundError(f"Invalid profile name: {name}")
+    root = PROFILES_DIR / name
+    try:
+        return load_profile_files(
+            name,
+            root / "best_chess_model.pth",
+            root / "move_to_number.json",
+            root / "book.bin",
+            root / "student_chess_model.pth",
+            root / "warm_cache.bin",
+        )
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        # torch.load, json, load_state_dict and the shape checks all fail differently
+        logger.exception("Failed to load profile %s", name)
+        raise ProfileLoadError(name) from e
+
+
+def profile_nbytes(profile: Profile) -> int:
+    nets = [profile.model] + ([profile.student] if profile.student is not None else [])
+    tensors = [t for net in nets for t in list(net.parameters()) + list(net.buffers())]
+    # vocab dicts are small next to the weights; count ~100 bytes per entry for both maps
+    size = sum(t.numel() * t.element_size() for t in tensors) + 200 * len(profile.move_to_number)
+    # a transformer's KV caches may grow to their cap, so the registry budgets for all of it
+    if profile.sessions is not None:
+        size += profile.sessions.max_bytes
+    return size
+
+
+try:
+    default_profile = load_profile_files(
+        DEFAULT_PROFILE, MODEL_PATH, MOVE_TO_NUMBER_PATH, BOOK_PATH, STUDENT_MODEL_PATH, WARM_CACHE_PATH
+    )
+except FileNotFoundError as e:
+    raise RuntimeError(str(e))
+
+# module-level aliases for the default profile, used by the offline tools
+model = default_profile.model
+move_to_number = default_profile.move_to_number
+number_to_move = default_profile.number_to_move
+
+registry = ModelRegistry(
+    load_profile,
+    profile_nbytes,
+    REGISTRY_MAX_BYTES,
+    remember_errors=(ProfileLoadError,),
+    error_ttl=PROFILE_RETRY_SECONDS,
+)
+registry.pin(DEFAULT_PROFILE, default_profile)
+
+# move planning runs off the event loop so queued requests can be counted and shed
+MOVE_WORKERS = int(os.environ.get("TEORIAT_MOVE_WORKERS", "1"))
+MAX_IN_FLIGHT = int(os.environ.get("TEORIAT_MAX_IN_FLIGHT", "64"))
+move_executor = ThreadPoolExecutor(max_workers=MOVE_WORKERS, thread_name_prefix="move")
+admission = AdmissionController(
+    [name for name, _ in QUALITY_TIERS],
+    MOVE_WORKERS,
+    MAX_IN_FLIGHT,
+    enabled=os.environ.get("TEORIAT_ADMISSION", "1") != "0",
+)
 
 
 class MoveRequest(BaseModel):
-    moves: list[str]
+    # full game so far; may be left out when a token is sent (needed only if it is rejected)
+    moves: list[str] = []
     mode: str = "rapid"
+    profile: str = DEFAULT_PROFILE
+    # token from the previous response plus the moves played since it
+    token: str | None = None
+    new_moves: list[str] = []
 
 
 class MoveResponse(BaseModel):
     move: str
+    token: str | None = None
+    tier: str = "full"  # quality tier that served this move (see QUALITY_TIERS)
 
 
 def build_board_from_uci(uci_moves: list[str]) -> chess.Board:
@@ -171,7 +421,31 @@ def build_board_from_uci(uci_moves: list[str]) -> chess.Board:
     return board
 
 
-def prepare_game_data(uci_moves: list[str]) -> tuple[list[int], list[int], list[int]]:
+def encode_move(
+    board: chess.Board, mv: chess.Move, profile: Profile | None = None
+) -> tuple[int, int, int]:
+    # (color, move_id, theory) for mv played from board; board must not have mv pushed yet
+    vocab = (profile or default_profile).move_to_number
+    san = board.san(mv)
+    color = 1 if board.turn == chess.WHITE else 0
+    return color, int(vocab.get(san, PAD_TOKEN)), 0
+
+
+def pad_window(
+    colors: list[int], moves: list[int], theory: list[int], length: int = MAX_SEQ_LEN
+) -> tuple[list[int], list[int], list[int]]:
+    pad = length - len(moves)
+    if pad > 0:
+        colors = [0] * pad + colors
+        moves = [PAD_TOKEN] * pad + moves
+        theory = [0] * pad + theory
+    return colors[-length:], moves[-length:], theory[-length:]
+
+
+def board_and_window(
+    uci_moves: list[str], profile: Profile | None = None
+) -> tuple[chess.Board, tuple[list[int], list[int], list[int]]]:
+    # validate, encode and build the board in a single replay
     board = chess.Board()
     colors: list[int] = []
     moves: list[int] = []
@@ -186,38 +460,116 @@ def prepare_game_data(uci_moves: list[str]) -> tuple[list[int], list[int], list[
         if mv not in board.legal_moves:
             raise HTTPException(status_code=400, detail=f"Illegal move: {uci} in {board.fen()}")
 
-        san = board.san(mv)
-        color = 1 if board.turn == chess.WHITE else 0
-        move_idx = move_to_number.get(san, PAD_TOKEN)
-
+        color, move_idx, th = encode_move(board, mv, profile)
         colors.append(color)
-        moves.append(int(move_idx))
-        theory.append(0)
+        moves.append(move_idx)
+        theory.append(th)
 
         board.push(mv)
 
-    while len(moves) < MAX_SEQ_LEN:
-        colors.insert(0, 0)
-        moves.insert(0, PAD_TOKEN)
-        theory.insert(0, 0)
+    return board, pad_window(colors, moves, theory, (profile or default_profile).context_len)
+
 
-    return colors[-MAX_SEQ_LEN:], moves[-MAX_SEQ_LEN:], theory[-MAX_SEQ_LEN:]
+def prepare_game_data(
+    uci_moves: list[str], profile: Profile | None = None
+) -> tuple[list[int], list[int], list[int]]:
+    return board_and_window(uci_moves, profile)[1]
 
 
-def model_logits_for(req_moves: list[str]) -> torch.Tensor:
-    colors, moves, theory = prepare_game_data(req_moves)
-    colors_t = torch.tensor([colors], device=device)
-    moves_t = torch.tensor([moves], device=device)
-    theory_t = torch.tensor([theory], device=device)
+def resume_from_token(
+    token: str, new_moves: list[str], profile: Profile
+) -> tuple[chess.Board, tuple[list[int], list[int], list[int]]] | None:
+    # None when the token is forged, corrupt or stale; the caller then replays the full game
+    decoded = decode_token(token, profile.name, profile.vocab_version, profile.context_len)
+    if decoded is None:
+        return None
+    board, (colors, moves, theory) = decoded
+
+    for uci in new_moves:
+        try:
+            mv = chess.Move.from_uci(uci)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid UCI: {uci}")
+
+        if mv not in board.legal_moves:
+            raise HTTPException(status_code=400, detail=f"Illegal move: {uci} in {board.fen()}")
+
+        color, move_idx, th = encode_move(board, mv, profile)
+        colors, moves, theory = pad_window(
+            colors + [color], moves + [move_idx], theory + [th], profile.context_len
+        )
+        board.push(mv)
+
+    return board, (colors, moves, theory)
+
+
+def next_token(
+    board: chess.Board, window: tuple[list[int], list[int], list[int]], mv: chess.Move, profile: Profile
+) -> str:
+    # token for the position after mv; pushes mv onto board
+    colors, moves, theory = window
+    color, move_idx, th = encode_move(board, mv, profile)
+    board.push(mv)
+    window = pad_window(colors + [color], moves + [move_idx], theory + [th], profile.context_len)
+    return encode_token(board, window, profile.name, profile.vocab_version)
+
+
+def model_for(profile: Profile, mode: str | None = None) -> ChessRNN | ChessTransformer:
+    # the distilled student, when the profile has one, serves the fast modes
+    if mode in STUDENT_MODES and profile.student is not None:
+        return profile.student
+    return profile.model
+
+
+def model_logits_for(
+    req_moves: list[str], profile: Profile | None = None, mode: str | None = None
+) -> torch.Tensor:
+    profile = profile or default_profile
+    board, window = board_and_window(req_moves, profile)
+    return model_logits_batch([window], profile, mode, [board])
+
+
+def model_logits_batch(
+    windows: list[tuple[list[int], list[int], list[int]]],
+    profile: Profile | None = None,
+    mode: str | None = None,
+    boards: list[chess.Board] | None = None,
+) -> torch.Tensor:
+    # one forward for many already-padded windows; row i matches windows[i] (and boards[i],
+    # the position to move from, which only models trained with board features read)
+    profile = profile or default_profile
+    net = model_for(profile, mode)
+    # a ChessRNN (e.g. the student of a transformer profile) reads only the last MAX_SEQ_LEN plies
+    keep = -MAX_SEQ_LEN if isinstance(net, ChessRNN) else 0
+    colors_t = torch.tensor([w[0][keep:] for w in windows], device=device)
+    moves_t = torch.tensor([w[1][keep:] for w in windows], device=device)
+    theory_t = torch.tensor([w[2][keep:] for w in windows], device=device)
+    extra = ()
+    if getattr(net, "board_proj", None) is not None:
+        if boards is None:
+            raise ValueError("this model reads board features; pass the boards")
+        extra = (torch.from_numpy(encode_boards(boards, net.board_attacks)).to(device),)
     with torch.no_grad():
-        return model(colors_t, moves_t, theory_t)
+        return net(colors_t, moves_t, theory_t, *extra)
+
 
+def serve_logits(
+    board: chess.Board,
+    window: tuple[list[int], list[int], list[int]],
+    profile: Profile,
+    mode: str | None = None,
+) -> torch.Tensor:
+    """Logits for one live request; a transformer profile reuses the game's KV cache"""
+    if profile.sessions is not None and model_for(profile, mode) is profile.model:
+        return profile.sessions.logits(window)
+    return model_logits_batch([window], profile, mode, [board])
 
-def try_book_move(board: chess.Board) -> chess.Move | None:
-    if not BOOK_PATH.exists():
+
+def try_book_move(board: chess.Board, book_path: Path = BOOK_PATH) -> chess.Move | None:
+    if not book_path.exists():
         return None
     try:
-        with chess.polyglot.open_reader(str(BOOK_PATH)) as reader:
+        with chess.polyglot.open_reader(str(book_path)) as reader:
             entry = reader.weighted_choice(board)
             mv = entry.move
             return mv if mv in board.legal_moves else None
@@ -241,7 +593,7 @@ def capture_score(board: chess.Board, mv: chess.Move) -> float:
     return float(120 + 14 * captured_value - 2 * attacker_value)
 
 
-def hang_penalty_simple(board_after: chess.Board, mv: chess.Move) -> float:
+def hang_penalty_simple(board_after: chess.Board, mv: chess.Move, w_hang: float = W_HANG) -> float:
     sq = mv.to_square
     piece = board_after.piece_at(sq)
     if not piece:
@@ -255,13 +607,13 @@ def hang_penalty_simple(board_after: chess.Board, mv: chess.Move) -> float:
     v = PIECE_VALUE.get(piece.piece_type, 0)
 
     if attacked and not defended:
-        return float(W_HANG * v)
+        return float(w_hang * v)
     if attacked:
         return float(W_ATTACKED * v)
     return 0.0
 
 
-def moved_piece_net_loss(board_after: chess.Board, mv: chess.Move) -> float:
+def moved_piece_net_loss(board_after: chess.Board, mv: chess.Move, w_hang_net: float = W_HANG_NET) -> float:
     sq = mv.to_square
     moved_piece = board_after.piece_at(sq)
     if not moved_piece:
@@ -303,7 +655,7 @@ def moved_piece_net_loss(board_after: chess.Board, mv: chess.Move) -> float:
     net = float(moved_v - best_recapture)
     if net <= 0:
         return 0.0
-    return W_HANG_NET * net
+    return w_hang_net * net
 
 
 def worst_reply_capture_loss(board_after: chess.Board) -> float:
@@ -350,14 +702,30 @@ def tactical_moves(board: chess.Board) -> list[chess.Move]:
     return out
 
 
-def pick_legal_move(board: chess.Board, logits: torch.Tensor, topk: int = TOPK) -> chess.Move:
+def score_candidates(
+    board: chess.Board,
+    logits: torch.Tensor,
+    topk: int | None = None,
+    params: EngineParams = DEFAULT_PARAMS,
+    profile: Profile | None = None,
+    repetition: bool = True,
+) -> list[tuple[chess.Move, float]]:
+    """Model + heuristic scores, best first; a mate in one comes back alone.
+
+    Empty when the model names no legal move. repetition=False leaves out
+    repetition_penalty, which depends on history beyond the board and window
+    (the warm-start cache stores scores that way and adds it per request).
+    """
+    topk = params.topk if topk is None else topk
+    number_to_move = (profile or default_profile).number_to_move
     log_probs = torch.log_softmax(logits[0], dim=0)
     _, top_idx = torch.topk(logits[0], k=min(topk, logits.shape[-1]))
 
     cand_map: dict[chess.Move, float] = {}
 
-    for mv in tactical_moves(board):
-        cand_map[mv] = 0.0
+    if params.heuristics:
+        for mv in tactical_moves(board):
+            cand_map[mv] = 0.0
 
     for idx in top_idx.tolist():
         san = number_to_move.get(int(idx))
@@ -374,54 +742,95 @@ def pick_legal_move(board: chess.Board, logits: torch.Tensor, topk: int = TOPK)
             cand_map[mv] = model_term
 
     if not cand_map:
-        legal = list(board.legal_moves)
-        if not legal:
-            raise HTTPException(status_code=400, detail="No legal moves (game over).")
-        return random.choice(legal)
+        return []
 
-    scored: list[tuple[chess.Move, float]] = []
+    if not params.heuristics:
+        return sorted(cand_map.items(), key=lambda x: x[1], reverse=True)
 
     for mv in cand_map.keys():
         board.push(mv)
         is_mate = board.is_checkmate()
         board.pop()
         if is_mate:
-            return mv
+            return [(mv, 0.0)]
+
+    scored: list[tuple[chess.Move, float]] = []
 
     for mv, model_term in cand_map.items():
         h = 0.0
         h += W_CAPTURE * capture_score(board, mv)
         if board.gives_check(mv):
-            h += W_CHECK
+            h += params.w_check
 
         board.push(mv)
 
-        h -= hang_penalty_simple(board, mv)
-        h -= moved_piece_net_loss(board, mv)
-        h -= W_WORST_REPLY * worst_reply_capture_loss(board)
-        h -= repetition_penalty(board)
+        h -= hang_penalty_simple(board, mv, params.w_hang)
+        if params.deep_heuristics:
+            h -= moved_piece_net_loss(board, mv, params.w_hang_net)
+            h -= params.w_worst_reply * worst_reply_capture_loss(board)
+        if repetition:
+            h -= repetition_penalty(board)
 
         board.pop()
 
-        score = model_term + HEURISTIC_WEIGHT * h
+        score = model_term + params.heuristic_weight * h
         scored.append((mv, score))
 
     scored.sort(key=lambda x: x[1], reverse=True)
-
-    keep = scored[: min(STYLE_SAMPLE_K, len(scored))]
-    moves = [m for m, _ in keep]
-    scores = [s for _, s in keep]
-
-    j = sample_index(scores, TEMPERATURE)
-    return moves[j]
+    return scored
+
+
+def sample_scored(scored: list[tuple[chess.Move, float]], params: EngineParams = DEFAULT_PARAMS) -> chess.Move:
+    # the engine's "style": sample among the best few rather than always playing the top move
+    if len(scored) == 1:
+        return scored[0][0]
+    keep = scored[: min(params.style_sample_k, len(scored))]
+    j = sample_index([s for _, s in keep], params.temperature)
+    return keep[j][0]
+
+
+def warm_cache_move(
+    board: chess.Board,
+    window: tuple[list[int], list[int], list[int]],
+    profile: Profile,
+    params: EngineParams = DEFAULT_PARAMS,
+) -> chess.Move | None:
+    # cached scores leave out repetition_penalty; add it when a repetition is possible at all
+    scored = profile.warm_cache.lookup(board, window)
+    if not scored:
+        return None
+    if board.halfmove_clock >= 2 and len(scored) > 1:
+        adjusted = []
+        for mv, score in scored:
+            board.push(mv)
+            adjusted.append((mv, score - DEFAULT_PARAMS.heuristic_weight * repetition_penalty(board)))
+            board.pop()
+        scored = sorted(adjusted, key=lambda x: x[1], reverse=True)
+    return sample_scored(scored, params)
+
+
+def pick_legal_move(
+    board: chess.Board,
+    logits: torch.Tensor,
+    topk: int | None = None,
+    params: EngineParams = DEFAULT_PARAMS,
+    profile: Profile | None = None,
+) -> chess.Move:
+    scored = score_candidates(board, logits, topk, params, profile)
+    if not scored:
+        legal = list(board.legal_moves)
+        if not legal:
+            raise HTTPException(status_code=400, detail="No legal moves (game over).")
+        return random.choice(legal)
+    return sample_scored(scored, params)
 
 
 def min_think_seconds(mode: str) -> float:
     if mode == "bullet":
-        return 0.20
+        return 0.20 * THINK_TIME_SCALE
     if mode == "rapid":
-        return 0.60
-    return 0.40
+        return 0.60 * THINK_TIME_SCALE
+    return 0.40 * THINK_TIME_SCALE
 
 
 @app.get("/")
@@ -429,29 +838,144 @@ def root():
     return {"message": "TEORIAT Chess Engine API", "status": "running"}
 
 
+def plan_move(
+    req: MoveRequest, profile: Profile, params: EngineParams | None = DEFAULT_PARAMS
+) -> tuple[chess.Move, str | None, bool]:
+    """The CPU-bound part of /move: position, book or model + heuristics, next token.
+
+    The flag says whether the model ran, i.e. whether the time spent says
+    anything about the tier's cost.
+    """
+    if req.new_moves and not req.token:
+        raise HTTPException(status_code=400, detail="new_moves needs a position token; send the full move list instead.")
+    resumed = resume_from_token(req.token, req.new_moves, profile) if req.token else None
+    if resumed is None and req.token and not req.moves:
+        raise HTTPException(status_code=409, detail="Position token rejected; resend the full move list.")
+    board, window = resumed or board_and_window(req.moves, profile)
+
+    ran_model = False
+    mv = try_book_move(board, profile.book_path)
+    if mv is None and profile.warm_cache is not None and model_for(profile, req.mode) is profile.model:
+        # entries hold the teacher's full-tier scoring (DEFAULT_PARAMS). Reduced tiers take a
+        # hit on purpose: it is full quality and cheaper than any of them. Modes served by
+        # the student skip the cache, so a mode's answers always come from its own model
+        mv = warm_cache_move(board, window, profile, params or DEFAULT_PARAMS)
+    if mv is None and params is None:
+        legal = list(board.legal_moves)
+        if not legal:
+            raise HTTPException(status_code=400, detail="No legal moves (game over).")
+        mv = random.choice(legal)
+    elif mv is None:
+        if profiler.armed:
+            logits = profiler.run_model(serve_logits, board, window, profile, req.mode)
+        else:
+            logits = serve_logits(board, window, profile, req.mode)
+        mv = pick_legal_move(board, logits, params=params, profile=profile)
+        ran_model = True
+    return mv, next_token(board, window, mv, profile), ran_model
+
+
+def plan_move_timed(
+    req: MoveRequest, profile: Profile, params: EngineParams | None
+) -> tuple[chess.Move, str | None, float | None]:
+    """plan_move plus its planning time, or None for the time when it says nothing about the tier.
+
+    That is when the model did not run, and when the profiler was armed: its
+    overhead would otherwise reach the admission EWMA and outlast the capture.
+    """
+    t0 = time.perf_counter()
+    profiled = profiler.armed
+    if profiled:
+        mv, token, ran_model = profiler.run(plan_move, req, profile, params)
+    else:
+        mv, token, ran_model = plan_move(req, profile, params)
+    return mv, token, (time.perf_counter() - t0) if ran_model and not profiled else None
+
+
+# out-of-book middlegame positions for timing the model tiers at startup
+CALIBRATION_GAMES = (
+    ["e2e4", "e7e5", "g1f3", "b8c6", "f1b5", "a7a6", "b5a4", "g8f6", "e1g1", "f8e7", "f1e1", "b7b5"],
+    ["d2d4", "d7d5", "c2c4", "e7e6", "b1c3", "g8f6", "c1g5", "f8e7", "e2e3", "e8g8", "g1f3", "h7h6"],
+    ["e2e4", "c7c5", "g1f3", "d7d6", "d2d4", "c5d4", "f3d4", "g8f6", "b1c3", "a7a6", "f1e2", "e7e5"],
+)
+
+
+def calibrate_admission(profile: Profile | None = None, rounds: int = 3):
+    """Time every model tier on CALIBRATION_GAMES and seed the admission costs"""
+    profile = profile or default_profile
+    positions = [board_and_window(uci, profile) for uci in CALIBRATION_GAMES]
+    costs = {}
+    for tier, (_, params) in enumerate(QUALITY_TIERS):
+        if params is None:
+            continue
+        times = []
+        for _ in range(rounds):
+            for board, window in positions:
+                t0 = time.perf_counter()
+                pick_legal_move(board, serve_logits(board, window, profile), params=params, profile=profile)
+                times.append(time.perf_counter() - t0)
+        costs[tier] = sorted(times)[len(times) // 2]
+    admission.calibrate(costs)
+    return costs
+
+
 @app.post("/move", response_model=MoveResponse)
 async def get_move(req: MoveRequest):
-    board = build_board_from_uci(req.moves) if req.moves else chess.Board()
-
     t0 = time.perf_counter()
 
-    book_mv = try_book_move(board)
-    if book_mv:
-        spent = time.perf_counter() - t0
-        wait = min_think_seconds(req.mode) - spent
-        if wait > 0:
-            await asyncio.sleep(wait)
-        return MoveResponse(move=book_mv.uci())
+    try:
+        profile = await registry.aget(req.profile)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown profile: {req.profile}")
+    except ProfileLoadError:
+        raise HTTPException(status_code=503, detail=f"Profile {req.profile} is unavailable")
+
+    tier = admission.admit(req.mode)
+    if tier is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Engine overloaded; retry shortly.",
+            headers={"Retry-After": str(admission.retry_after())},
+        )
+    tier_name, params = QUALITY_TIERS[tier]
+
+    t_admit = time.perf_counter()
+
+    def finished(future):
+        # the slot frees when the planning does: a client that disconnects or times
+        # out leaves the work running, and it still counts as load until then
+        if future.cancelled() or future.exception() is not None:
+            admission.abandon()
+        else:
+            admission.release(req.mode, tier, time.perf_counter() - t_admit, future.result()[2])
 
-    logits = model_logits_for(req.moves)
-    mv = pick_legal_move(board, logits, topk=TOPK)
+    future = move_executor.submit(plan_move_timed, req, profile, params)
+    future.add_done_callback(finished)
+    mv, token, _ = await asyncio.wrap_future(future)
 
     spent = time.perf_counter() - t0
     wait = min_think_seconds(req.mode) - spent
     if wait > 0:
         await asyncio.sleep(wait)
 
-    return MoveResponse(move=mv.uci())
+    return MoveResponse(move=mv.uci(), token=token, tier=tier_name)
+
+
+@app.get("/admission")
+def get_admission():
+    return admission.stats()
+
+
+@app.get("/profiles")
+def get_profiles():
+    stats = registry.stats()
+    for name, entry in stats["profiles"].items():
+        profile = registry.peek(name)
+        if profile is not None and profile.warm_cache is not None:
+            entry["warm_cache"] = profile.warm_cache.stats()
+        if profile is not None and profile.sessions is not None:
+            entry["kv_sessions"] = profile.sessions.stats()
+    return stats
 
 
 @app.get("/legal_moves")
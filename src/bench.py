@@ -0,0 +1,192 @@
+"""Microbenchmarks for the engine hot path
+
+Every function is timed over a fixed corpus of opening, middlegame and endgame
+positions taken from cleaned_data.csv, so numbers are comparable between runs.
+
+Example:
+    python -m src.bench --out bench.json
+    python -m src.bench --baseline bench.json --threshold 0.10   # exit 1 on regression
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import chess
+import torch
+
+from . import app as engine
+from .corpus import load_games, plies_to_uci
+from .stats import git_revision
+
+PHASES = ("opening", "middlegame", "endgame")
+POSITIONS_PER_PHASE = 24
+MIN_ROUND_SECONDS = 0.05
+ROUNDS = 7
+
+
+def phase_of(board: chess.Board) -> str:
+    # non-pawn material of both sides, in PIECE_VALUE units
+    material = sum(
+        engine.PIECE_VALUE[p.piece_type]
+        for p in board.piece_map().values()
+        if p.piece_type not in (chess.PAWN, chess.KING)
+    )
+    if board.ply() <= 16:
+        return "opening"
+    if material <= 26:
+        return "endgame"
+    return "middlegame"
+
+
+def build_corpus(per_phase: int = POSITIONS_PER_PHASE, seed: int = 0) -> dict[str, list[list[str]]]:
+    """Deterministic per-phase sample of game prefixes (as UCI lists) with moves still to play"""
+    buckets: dict[str, list[list[str]]] = {p: [] for p in PHASES}
+    for _, plies in load_games():
+        uci = plies_to_uci(plies)
+        board = chess.Board()
+        for i, u in enumerate(uci):
+            if i >= 4 and not board.is_game_over():
+                buckets[phase_of(board)].append(uci[:i])
+            board.push_uci(u)
+
+    rng = random.Random(seed)
+    return {p: rng.sample(b, min(per_phase, len(b))) for p, b in buckets.items()}
+
+
+def _time_rounds(fn, calls_per_round: int) -> dict:
+    # grow the inner loop until one round takes MIN_ROUND_SECONDS, then take ROUNDS samples
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - t0 >= MIN_ROUND_SECONDS or loops >= 1 << 16:
+            break
+        loops *= 2
+
+    samples = []
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - t0) / (loops * calls_per_round))
+    samples.sort()
+    return {
+        "us_per_call": samples[len(samples) // 2] * 1e6,
+        "us_min": samples[0] * 1e6,
+        "calls": loops * calls_per_round * ROUNDS,
+    }
+
+
+def bench_cases(histories: list[list[str]]) -> dict:
+    """name -> (callable running every item once, items per call)"""
+    boards = [engine.build_board_from_uci(h) for h in histories]
+    logits = [engine.model_logits_for(h) for h in histories]
+    pairs = [(b, mv) for b in boards for mv in b.legal_moves]
+    after = []
+    for b, mv in pairs:
+        a = b.copy()
+        a.push(mv)
+        after.append((a, mv))
+
+    def each(fn, items):
+        def run():
+            for it in items:
+                fn(*it)
+
+        return run, len(items)
+
+    def pick_all():
+        random.seed(0)
+        torch.manual_seed(0)
+        for b, lg in zip(boards, logits):
+            engine.pick_legal_move(b, lg)
+
+    return {
+        "build_board_from_uci": each(engine.build_board_from_uci, [(h,) for h in histories]),
+        "prepare_game_data": each(engine.prepare_game_data, [(h,) for h in histories]),
+        "model_logits_for": each(engine.model_logits_for, [(h,) for h in histories]),
+        "tactical_moves": each(engine.tactical_moves, [(b,) for b in boards]),
+        "pick_legal_move": (pick_all, len(boards)),
+        "capture_score": each(engine.capture_score, pairs),
+        "hang_penalty_simple": each(engine.hang_penalty_simple, after),
+        "moved_piece_net_loss": each(engine.moved_piece_net_loss, after),
+        "worst_reply_capture_loss": each(engine.worst_reply_capture_loss, [(a,) for a, _ in after]),
+        "repetition_penalty": each(engine.repetition_penalty, [(a,) for a, _ in after]),
+    }
+
+
+def run_suite(per_phase: int, only: list[str] | None = None) -> dict:
+    corpus = build_corpus(per_phase)
+    results = {}
+    for phase, histories in corpus.items():
+        for name, (fn, n) in bench_cases(histories).items():
+            if only and name not in only:
+                continue
+            results[f"{name}/{phase}"] = _time_rounds(fn, n)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Names whose median got slower than baseline by more than threshold (fraction)"""
+    slower = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        ratio = cur["us_per_call"] / base["us_per_call"] if base["us_per_call"] else 1.0
+        cur["vs_baseline"] = ratio
+        if ratio > 1.0 + threshold:
+            slower.append(key)
+    return slower
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="TEORIAT engine microbenchmarks")
+    parser.add_argument("--positions", type=int, default=POSITIONS_PER_PHASE, help="positions per phase")
+    parser.add_argument("--threads", type=int, default=1, help="torch intra-op threads")
+    parser.add_argument("--only", nargs="*", help="benchmark names to run")
+    parser.add_argument("--out", help="write the JSON results here")
+    parser.add_argument("--baseline", help="JSON results from a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, e.g. 0.10 = 10%%")
+    args = parser.parse_args(argv)
+
+    torch.set_num_threads(args.threads)
+
+    results = run_suite(args.positions, args.only)
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "positions_per_phase": args.positions,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+        report["regressions"] = regressions
+
+    for key, r in results.items():
+        ratio = f"  x{r['vs_baseline']:.2f}" if "vs_baseline" in r else ""
+        flag = "  REGRESSION" if key in regressions else ""
+        print(f"  {key:40s} {r['us_per_call']:>10.2f}us{ratio}{flag}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Throughput of the board feature encoder in positions/sec
+
+Compares a per-square Python loop (piece_at over 64 squares x 12 planes)
+against features.py one position at a time (the /move path) and in batches
+(the training dataset builder), with and without attack planes.
+
+Example:
+    python -m src.bench_features --games 200 --batch-sizes 64 1024
+"""
+
+import argparse
+import json
+import time
+
+import chess
+import numpy as np
+
+from .corpus import load_games
+from .features import encode_board, encode_boards, feature_dim, game_features
+
+BATCH_SIZES = (64, 1024)
+REPEATS = 3
+
+
+def naive_encode(board: chess.Board) -> np.ndarray:
+    """Reference encoder, square by square"""
+    out = np.zeros(feature_dim(), dtype=np.uint8)
+    for plane, (color, piece_type) in enumerate(
+        (c, pt) for c in (chess.WHITE, chess.BLACK) for pt in chess.PIECE_TYPES
+    ):
+        for sq in range(64):
+            piece = board.piece_at(sq)
+            if piece is not None and piece.color == color and piece.piece_type == piece_type:
+                out[plane * 64 + sq] = 1
+    base = 12 * 64
+    out[base] = board.turn == chess.WHITE
+    out[base + 1] = board.has_kingside_castling_rights(chess.WHITE)
+    out[base + 2] = board.has_queenside_castling_rights(chess.WHITE)
+    out[base + 3] = board.has_kingside_castling_rights(chess.BLACK)
+    out[base + 4] = board.has_queenside_castling_rights(chess.BLACK)
+    if board.ep_square is not None:
+        out[base + 5 + chess.square_file(board.ep_square)] = 1
+    return out
+
+
+def _rate(fn, n: int) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return n / best
+
+
+def corpus_positions(n_games: int) -> tuple[list[chess.Board], list[list[str]]]:
+    boards, sans = [], []
+    for _, plies in load_games()[:n_games]:
+        game = [san for _, san, _ in plies]
+        sans.append(game)
+        board = chess.Board()
+        for san in game:
+            boards.append(board.copy(stack=False))
+            try:
+                board.push_san(san)
+            except ValueError:
+                break
+    return boards, sans
+
+
+def run(n_games: int, batch_sizes: tuple[int, ...]) -> dict:
+    boards, sans = corpus_positions(n_games)
+    n = len(boards)
+    assert all((naive_encode(b) == encode_board(b)).all() for b in boards[:500])
+
+    report = {"positions": n, "naive_single": _rate(lambda: [naive_encode(b) for b in boards], n)}
+    for attacks in (False, True):
+        suffix = "_attacks" if attacks else ""
+        report[f"single{suffix}"] = _rate(lambda: [encode_board(b, attacks) for b in boards], n)
+        for size in batch_sizes:
+            report[f"batch{size}{suffix}"] = _rate(
+                lambda: [encode_boards(boards[i : i + size], attacks) for i in range(0, n, size)], n
+            )
+        plies = sum(len(g) for g in sans)
+        report[f"game_features{suffix}"] = _rate(lambda: [game_features(g, attacks) for g in sans], plies)
+    return report
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark board feature encoding throughput")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(BATCH_SIZES))
+    args = parser.parse_args(argv)
+
+    report = run(args.games, tuple(args.batch_sizes))
+    for key, value in report.items():
+        if key != "positions":
+            print(f"  {key:>24s}: {value:>12,.0f} positions/s")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
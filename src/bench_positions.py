@@ -0,0 +1,174 @@
+"""Size and speed of packed positions versus the old two-FEN-per-ply layout
+
+Without --db only the encoding itself is measured over cleaned_data.csv. With
+--db, scratch copies of both game_moves layouts are created in the configured
+Postgres database to measure table size, ingest rate and lookup rate.
+
+Example:
+    python -m src.bench_positions --db --games 500
+"""
+
+import argparse
+import json
+import random
+import time
+
+import chess
+
+from .corpus import load_games, plies_to_uci
+from .positions import fen_of, pack_board, same_position, zobrist_key
+
+LOOKUPS = 1000
+
+_FEN_TABLE = """
+    CREATE TABLE bench_moves_fen (
+        id SERIAL PRIMARY KEY, game_id TEXT, move_number INT, player_color TEXT,
+        move_san TEXT, position_before TEXT, position_after TEXT,
+        is_teoriat_move BOOLEAN, teoriat_color TEXT
+    )
+"""
+_PACKED_TABLE = """
+    CREATE TABLE bench_moves_packed (
+        id SERIAL PRIMARY KEY, game_id TEXT, move_number INT, player_color TEXT,
+        move_san TEXT, position_key BIGINT, position BYTEA,
+        is_teoriat_move BOOLEAN, teoriat_color TEXT
+    )
+"""
+
+
+def corpus_boards(n_games: int) -> list[tuple[str, list[tuple[chess.Board, chess.Move, bool]]]]:
+    out = []
+    for game_id, plies in load_games()[:n_games]:
+        board = chess.Board()
+        rows = []
+        for uci, (_, _, is_teoriat) in zip(plies_to_uci(plies), plies):
+            mv = chess.Move.from_uci(uci)
+            rows.append((board.copy(), mv, is_teoriat))
+            board.push(mv)
+        out.append((game_id, rows))
+    return out
+
+
+def measure_encoding(games) -> dict:
+    boards = [b for _, rows in games for b, _, _ in rows]
+    t0 = time.perf_counter()
+    fens = [b.fen() for b in boards]
+    fen_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    packed = [pack_board(b) for b in boards]
+    keys = [zobrist_key(b) for b in boards]
+    pack_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for p in packed:
+        fen_of(p)
+    unpack_s = time.perf_counter() - t0
+
+    n = len(boards)
+    return {
+        "positions": n,
+        "fen_pair_bytes_per_ply": 2 * sum(len(f) for f in fens) / n,
+        "packed_bytes_per_ply": sum(len(p) for p in packed) / n + 8,  # + BIGINT key
+        "fen_encode_per_sec": n / fen_s,
+        "pack_and_hash_per_sec": n / pack_s,
+        "fen_materialize_per_sec": n / unpack_s,
+        "distinct_keys": len(set(keys)),
+    }
+
+
+def measure_db(games, lookups: int, seed: int) -> dict:
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    from .tables import DB_CONFIG
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS bench_moves_fen, bench_moves_packed")
+    cursor.execute(_FEN_TABLE)
+    cursor.execute(_PACKED_TABLE)
+    conn.commit()
+
+    def ingest(table: str, columns: str, make_row) -> float:
+        t0 = time.perf_counter()
+        for game_id, rows in games:
+            values = [make_row(game_id, i, b, mv, t) for i, (b, mv, t) in enumerate(rows)]
+            if values:
+                execute_values(cursor, f"INSERT INTO {table} ({columns}) VALUES %s", values)
+            conn.commit()
+        return time.perf_counter() - t0
+
+    def fen_row(game_id, i, b, mv, t):
+        after = b.copy(stack=False)
+        after.push(mv)
+        color = "white" if b.turn else "black"
+        return (game_id, i // 2 + 1, color, b.san(mv), b.fen(), after.fen(), t, color)
+
+    def packed_row(game_id, i, b, mv, t):
+        color = "white" if b.turn else "black"
+        return (game_id, i // 2 + 1, color, b.san(mv), zobrist_key(b), psycopg2.Binary(pack_board(b)), t, color)
+
+    common = "game_id, move_number, player_color, move_san, {}, is_teoriat_move, teoriat_color"
+    fen_ingest = ingest("bench_moves_fen", common.format("position_before, position_after"), fen_row)
+    packed_ingest = ingest("bench_moves_packed", common.format("position_key, position"), packed_row)
+
+    cursor.execute("CREATE INDEX ON bench_moves_fen(position_before)")
+    cursor.execute("CREATE INDEX ON bench_moves_packed(position_key)")
+    cursor.execute("ANALYZE bench_moves_fen")
+    cursor.execute("ANALYZE bench_moves_packed")
+    conn.commit()
+
+    cursor.execute("SELECT pg_total_relation_size('bench_moves_fen'), pg_total_relation_size('bench_moves_packed')")
+    fen_size, packed_size = cursor.fetchone()
+
+    rng = random.Random(seed)
+    boards = [b for _, rows in games for b, _, _ in rows]
+    sample = [boards[rng.randrange(len(boards))] for _ in range(lookups)]
+
+    t0 = time.perf_counter()
+    for b in sample:
+        cursor.execute("SELECT move_san FROM bench_moves_fen WHERE position_before = %s", (b.fen(),))
+        cursor.fetchall()
+    fen_lookup = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for b in sample:
+        cursor.execute("SELECT move_san, position FROM bench_moves_packed WHERE position_key = %s", (zobrist_key(b),))
+        _ = [r for r in cursor.fetchall() if same_position(r[1], b)]
+    packed_lookup = time.perf_counter() - t0
+
+    cursor.execute("DROP TABLE bench_moves_fen, bench_moves_packed")
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    n = len(boards)
+    return {
+        "rows": n,
+        "fen_table_bytes": fen_size,
+        "packed_table_bytes": packed_size,
+        "fen_ingest_rows_per_sec": n / fen_ingest,
+        "packed_ingest_rows_per_sec": n / packed_ingest,
+        "fen_lookups_per_sec": lookups / fen_lookup,
+        "packed_lookups_per_sec": lookups / packed_lookup,
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark packed vs FEN position storage")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--db", action="store_true", help="also measure against Postgres (tables.DB_CONFIG)")
+    parser.add_argument("--lookups", type=int, default=LOOKUPS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    games = corpus_boards(args.games)
+    report = {"encoding": measure_encoding(games)}
+    if args.db:
+        report["database"] = measure_db(games, args.lookups, args.seed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Per-request position cost of /move by game length: full replay vs position token
+
+Only the position work is timed (validation, encoding, repetition history,
+issuing the next token), not the model or heuristics, which are the same on
+both paths.
+
+Example:
+    python -m src.bench_token --lengths 10 40 80 120 160
+"""
+
+import argparse
+import json
+import time
+
+from . import app as engine
+from .corpus import load_games, plies_to_uci
+
+LENGTHS = (10, 40, 80, 120, 160)
+SAMPLES = 50
+REPEATS = 5
+
+
+def _best_of(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(lengths: tuple[int, ...], samples: int) -> list[dict]:
+    profile = engine.default_profile
+    games = [plies_to_uci(p) for _, p in load_games()]
+    rows = []
+    for n in lengths:
+        prefixes = [g[: n + 1] for g in games if len(g) > n][:samples]
+        if not prefixes:
+            continue
+
+        # token issued after ply n-1, the request brings ply n
+        cases = []
+        for uci in prefixes:
+            board, window = engine.board_and_window(uci[: n - 1], profile)
+            token = engine.next_token(board, window, board.parse_uci(uci[n - 1]), profile)
+            cases.append((uci, token))
+
+        def full():
+            for uci, _ in cases:
+                engine.board_and_window(uci, profile)
+
+        def resumed():
+            for uci, token in cases:
+                board, window = engine.resume_from_token(token, [uci[n]], profile)
+                engine.next_token(board, window, next(iter(board.legal_moves)), profile)
+
+        full_s = _best_of(full, REPEATS) / len(cases)
+        token_s = _best_of(resumed, REPEATS) / len(cases)
+        rows.append(
+            {
+                "plies": n,
+                "games": len(cases),
+                "full_replay_us": full_s * 1e6,
+                "token_us": token_s * 1e6,
+                "speedup": full_s / token_s if token_s else 0.0,
+                "token_bytes": sum(len(t) for _, t in cases) / len(cases),
+            }
+        )
+    return rows
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark /move position handling by game length")
+    parser.add_argument("--lengths", type=int, nargs="+", default=list(LENGTHS))
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="games per length")
+    args = parser.parse_args(argv)
+
+    rows = run(tuple(args.lengths), args.samples)
+    for r in rows:
+        print(
+            f"  {r['plies']:>4d} plies: full {r['full_replay_us']:>9.1f}us"
+            f"  token {r['token_us']:>8.1f}us  x{r['speedup']:.1f}  ({r['token_bytes']:.0f} B token)"
+        )
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
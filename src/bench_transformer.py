@@ -0,0 +1,136 @@
+"""Per-move model latency and memory by game length: ChessRNN vs ChessTransformer
+
+For every length the transformer is timed three ways: recomputing the whole
+game (a KVSessions miss), recomputing the window padded to max_len (the
+batched model_logits_batch path) and extending the game's KV cache by the two
+new plies (the engine's last move and the reply), which is the steady state
+under KVSessions. The GRU always reads the last
+MAX_SEQ_LEN plies, so its cost does not depend on the length.
+
+Latency does not depend on training, so without --weights the transformer is
+randomly initialised with the default shape.
+
+Example:
+    python -m src.bench_transformer --lengths 10 40 80 160 240 --weights src/checkpoints/transformer.pth
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+import torch
+
+from . import app as engine
+from .corpus import load_games, plies_to_tokens
+from .transformer import ChessTransformer, KVCache
+
+LENGTHS = (10, 40, 80, 160, 240)
+SAMPLES = 20
+REPEATS = 5
+
+
+def _median_ms(fn, cases, repeats: int) -> float:
+    times = []
+    with torch.no_grad():
+        for case in cases:
+            best = float("inf")
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                fn(case)
+                best = min(best, time.perf_counter() - t0)
+            times.append(best)
+    return statistics.median(times) * 1000
+
+
+def _tensors(tokens):
+    return tuple(torch.tensor([[tok[i] for tok in tokens]], device=engine.device) for i in range(3))
+
+
+def _param_bytes(net) -> int:
+    return sum(p.numel() * p.element_size() for p in net.parameters())
+
+
+def run(lengths: tuple[int, ...], samples: int, weights: Path | None) -> dict:
+    if weights is not None:
+        transformer = engine.model_from_state(torch.load(weights, map_location=engine.device))
+    else:
+        transformer = ChessTransformer(
+            vocab_size=engine.default_profile.model.fc.out_features, pad_token=engine.PAD_TOKEN
+        ).to(engine.device)
+    transformer.eval()
+    gru = engine.default_profile.model
+
+    games = [plies_to_tokens(p, engine.move_to_number, engine.PAD_TOKEN) for _, p in load_games()]
+    rows = []
+    for n in lengths:
+        if n > transformer.max_len:
+            continue
+        cases = [g[:n] for g in games if len(g) >= n][:samples]
+        if not cases:
+            continue
+
+        gru_ms = _median_ms(lambda toks: gru(*_tensors(toks[-engine.MAX_SEQ_LEN :])), cases, REPEATS)
+        full_ms = _median_ms(lambda toks: transformer(*_tensors(toks)), cases, REPEATS)
+        # model_logits_batch gets windows padded to the profile's context_len
+        padded_ms = _median_ms(
+            lambda toks: transformer(*_tensors([(0, engine.PAD_TOKEN, 0)] * (transformer.max_len - n) + toks)),
+            cases,
+            REPEATS,
+        )
+        prefixes = [(transformer.extend(KVCache(), toks[:-2]) if n > 2 else KVCache(), toks) for toks in cases]
+        incremental_ms = _median_ms(
+            lambda case: transformer.extend(case[0], case[1][len(case[0].tokens) :]), prefixes, REPEATS
+        )
+        kv_bytes = transformer.extend(KVCache(), cases[0]).nbytes
+
+        rows.append(
+            {
+                "plies": n,
+                "games": len(cases),
+                "gru_ms": gru_ms,
+                "transformer_full_ms": full_ms,
+                "transformer_padded_ms": padded_ms,
+                "transformer_incremental_ms": incremental_ms,
+                "kv_bytes_per_game": kv_bytes,
+            }
+        )
+
+    return {
+        "gru": {"parameters": sum(p.numel() for p in gru.parameters()), "param_bytes": _param_bytes(gru)},
+        "transformer": {
+            "parameters": sum(p.numel() for p in transformer.parameters()),
+            "param_bytes": _param_bytes(transformer),
+            "max_len": transformer.max_len,
+            "weights": str(weights) if weights else None,
+        },
+        "lengths": rows,
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark GRU vs KV-cached transformer per-move cost")
+    parser.add_argument("--lengths", type=int, nargs="+", default=list(LENGTHS))
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="games per length")
+    parser.add_argument("--weights", type=Path, help="trained transformer state_dict (default: random init)")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads; 0 = torch default")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    report = run(tuple(args.lengths), args.samples, args.weights)
+
+    g, t = report["gru"], report["transformer"]
+    print(f"Parameters: GRU {g['parameters']:,}  transformer {t['parameters']:,}")
+    for r in report["lengths"]:
+        print(
+            f"  {r['plies']:>4d} plies: GRU {r['gru_ms']:.3f}ms  full {r['transformer_full_ms']:.3f}ms"
+            f"  padded {r['transformer_padded_ms']:.3f}ms  KV {r['transformer_incremental_ms']:.3f}ms"
+            f"  ({r['kv_bytes_per_game'] / 1024:.0f} KiB KV)"
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
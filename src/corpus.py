@@ -0,0 +1,76 @@
+"""Loading helpers for the exported game corpus (cleaned_data.csv)"""
+
+import ast
+import csv
+from pathlib import Path
+
+import chess
+
+BASE_DIR = Path(__file__).resolve().parent
+CSV_PATH = BASE_DIR.parent / "cleaned_data.csv"
+
+# one ply as exported by the Analysis notebook: (color, san, is_teoriat_move)
+Ply = tuple[str, str, bool]
+
+
+def load_games(path: Path = CSV_PATH) -> list[tuple[str, list[Ply]]]:
+    """Return (game_id, plies) for every row, in file (time) order"""
+    games = []
+    with Path(path).open("r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            games.append((row["game_id"], ast.literal_eval(row["moves"])))
+    return games
+
+
+def plies_to_uci(plies: list[Ply]) -> list[str]:
+    """Replay SAN plies from the start position; stops at the first unplayable move"""
+    board = chess.Board()
+    out = []
+    for _, san, _ in plies:
+        try:
+            mv = board.parse_san(san)
+        except ValueError:
+            break
+        out.append(mv.uci())
+        board.push(mv)
+    return out
+
+
+def plies_to_tokens(
+    plies: list[Ply], move_to_number: dict[str, int], pad_token: int
+) -> list[tuple[int, int, int]]:
+    """(color, move_id, teoriat_flag) per ply, encoded the same way as the RNN_model notebook"""
+    return [
+        (1 if color == "white" else 0, int(move_to_number.get(san, pad_token)), 1 if flag else 0)
+        for color, san, flag in plies
+    ]
+
+
+def history_window(
+    tokens: list[tuple[int, int, int]], end: int, max_seq_len: int, pad_token: int
+) -> tuple[list[int], list[int], list[int]]:
+    """Left-padded (colors, moves, theory) for the max_seq_len tokens before index end"""
+    window = tokens[max(0, end - max_seq_len) : end]
+    window = [(0, pad_token, 0)] * (max_seq_len - len(window)) + window
+    return [t[0] for t in window], [t[1] for t in window], [t[2] for t in window]
+
+
+def load_games_from_db() -> list[tuple[str, list[Ply]]]:
+    """Same shape as load_games, read from the game_moves table in ingest order"""
+    import psycopg2
+
+    from .tables import DB_CONFIG
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT game_id, player_color, move_san, is_teoriat_move
+        FROM game_moves
+        ORDER BY MIN(id) OVER (PARTITION BY game_id), id
+    """)
+    games: dict[str, list[Ply]] = {}
+    for game_id, color, san, is_teoriat in cursor:
+        games.setdefault(game_id, []).append((color, san, bool(is_teoriat)))
+    cursor.close()
+    conn.close()
+    return list(games.items())
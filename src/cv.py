@@ -0,0 +1,352 @@
+"""Parallel time-series cross-validation over a hyperparameter grid
+
+Every (fold, grid point) pair is an independent job on a process pool. Folds
+are the notebook's TimeSeriesSplit over the example index (file order is time
+order), so each fold validates on games played after its training games.
+torch intra-op threads are split between workers so the pool does not
+oversubscribe the cores.
+
+Each job checkpoints after every epoch (`last.pth`, plus `best_chess_model.pth`
+at the best validation accuracy) and stops early after --patience epochs
+without improvement. --resume skips finished jobs and continues unfinished
+ones from their last epoch.
+
+Example:
+    python -m src.cv --folds 5 --grid hidden_dim=128,256 learning_rate=0.0003,0.001 --workers 8 --out cv.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import torch
+from sklearn.model_selection import TimeSeriesSplit
+from torch.utils.data import DataLoader, SubsetRandomSampler
+
+from .corpus import BASE_DIR, load_games, plies_to_tokens
+from .features import feature_dim, game_features
+from .stats import git_revision
+from .training import (
+    BATCH_SIZE,
+    LEARNING_RATE,
+    MAX_LR,
+    NUM_EPOCHS,
+    WEIGHT_DECAY,
+    make_examples,
+    train_epoch,
+    validate,
+)
+
+CV_DIR = BASE_DIR / "checkpoints" / "cv"
+N_SPLITS = 5
+PATIENCE = 3
+
+# grid keys: ChessRNN constructor arguments and optimizer settings
+MODEL_KEYS = {"embedding_dim": int, "hidden_dim": int, "num_layers": int, "dropout": float}
+OPTIM_KEYS = {"learning_rate": float, "max_lr": float, "weight_decay": float, "batch_size": int}
+OPTIM_DEFAULTS = {
+    "learning_rate": LEARNING_RATE,
+    "max_lr": MAX_LR,
+    "weight_decay": WEIGHT_DECAY,
+    "batch_size": BATCH_SIZE,
+}
+
+_dataset = None
+
+
+def parse_grid(items: list[str]) -> list[dict]:
+    """["hidden_dim=128,256", "learning_rate=0.001"] -> the cartesian product as dicts"""
+    axes = {}
+    for item in items:
+        key, _, values = item.partition("=")
+        key = key.strip()
+        cast = MODEL_KEYS.get(key) or OPTIM_KEYS.get(key)
+        if cast is None:
+            raise SystemExit(f"unknown grid key: {key} (expected one of {sorted(MODEL_KEYS | OPTIM_KEYS)})")
+        axes[key] = [cast(v) for v in values.split(",") if v]
+    keys = list(axes)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(axes[k] for k in keys))]
+
+
+def point_name(point: dict) -> str:
+    return "-".join(f"{k}={v}" for k, v in sorted(point.items())) or "default"
+
+
+def build_dataset(max_games: int | None, board_features: str = "none"):
+    from .app import PAD_TOKEN, move_to_number
+
+    games = load_games()
+    if max_games:
+        games = games[:max_games]
+    features = None
+    if board_features != "none":
+        attacks = board_features == "attacks"
+        features = [game_features([san for _, san, _ in p], attacks) for _, p in games]
+    return make_examples([plies_to_tokens(p, move_to_number, PAD_TOKEN) for _, p in games], features)
+
+
+def _init_worker(threads: int, max_games: int | None, board_features: str):
+    global _dataset
+    torch.set_num_threads(threads)
+    _dataset = build_dataset(max_games, board_features)
+
+
+def train_job(
+    fold: int,
+    train_idx: list[int],
+    val_idx: list[int],
+    point: dict,
+    epochs: int,
+    patience: int,
+    job_dir: str,
+    resume: bool,
+    seed: int,
+    board_features: str = "none",
+) -> dict:
+    """Train one (fold, grid point) to completion or early stop; runs in a pool worker"""
+    from .app import PAD_TOKEN, ChessRNN, device, move_to_number
+
+    job_dir = Path(job_dir)
+    job_dir.mkdir(parents=True, exist_ok=True)
+    result_path = job_dir / "result.json"
+    if resume and result_path.exists():
+        return json.loads(result_path.read_text(encoding="utf-8"))
+
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    torch.manual_seed(seed)
+    opt = {**OPTIM_DEFAULTS, **{k: v for k, v in point.items() if k in OPTIM_KEYS}}
+    board_dim = feature_dim(board_features == "attacks") if board_features != "none" else 0
+    model_args = {k: v for k, v in point.items() if k in MODEL_KEYS}
+    # the dataset is encoded with the live vocab, which finetune --install may have grown
+    vocab_size = max(max(move_to_number.values()), PAD_TOKEN) + 1
+    model = ChessRNN(vocab_size=vocab_size, board_features=board_dim, **model_args).to(device)
+
+    train_loader = DataLoader(_dataset, batch_size=opt["batch_size"], sampler=SubsetRandomSampler(train_idx))
+    # the indices themselves, in order: SequentialSampler(val_idx) would walk range(len(val_idx))
+    val_loader = DataLoader(_dataset, batch_size=opt["batch_size"] * 16, sampler=val_idx)
+    loss_func = torch.nn.CrossEntropyLoss()
+    optimizer = torch.optim.AdamW(
+        model.parameters(), lr=opt["learning_rate"], weight_decay=opt["weight_decay"]
+    )
+    scheduler = torch.optim.lr_scheduler.OneCycleLR(
+        optimizer, max_lr=opt["max_lr"], epochs=epochs, steps_per_epoch=len(train_loader), pct_start=0.1
+    )
+
+    start_epoch, best_acc, best_epoch, history, cpu_before = 0, 0.0, 0, [], 0.0
+    last_path = job_dir / "last.pth"
+    if resume and last_path.exists():
+        ckpt = torch.load(last_path, map_location=device)
+        model.load_state_dict(ckpt["model"])
+        optimizer.load_state_dict(ckpt["optimizer"])
+        scheduler.load_state_dict(ckpt["scheduler"])
+        start_epoch, history = ckpt["epoch"], ckpt["history"]
+        best_acc, best_epoch = ckpt["best_acc"], ckpt["best_epoch"]
+        cpu_before = ckpt["cpu_seconds"]
+
+    stopped_early = False
+    for epoch in range(start_epoch, epochs):
+        if len(history) - best_epoch >= patience:
+            stopped_early = True
+            break
+        train_loss, train_acc = train_epoch(model, train_loader, optimizer, loss_func, device, scheduler)
+        val_loss, val_acc = validate(model, val_loader, loss_func, device)
+        history.append(
+            {
+                "epoch": epoch + 1,
+                "train_loss": train_loss,
+                "train_acc": train_acc,
+                "val_loss": val_loss,
+                "val_acc": val_acc,
+            }
+        )
+        if val_acc > best_acc:
+            best_acc, best_epoch = val_acc, epoch + 1
+            torch.save(model.state_dict(), job_dir / "best_chess_model.pth")
+        torch.save(
+            {
+                "model": model.state_dict(),
+                "optimizer": optimizer.state_dict(),
+                "scheduler": scheduler.state_dict(),
+                "epoch": epoch + 1,
+                "best_acc": best_acc,
+                "best_epoch": best_epoch,
+                "history": history,
+                "cpu_seconds": cpu_before + time.process_time() - cpu0,
+            },
+            last_path,
+        )
+
+    best = history[best_epoch - 1] if best_epoch else (history[-1] if history else {})
+    result = {
+        "fold": fold,
+        "point": point,
+        "train_examples": len(train_idx),
+        "val_examples": len(val_idx),
+        "epochs_run": len(history),
+        "stopped_early": stopped_early,
+        "best_epoch": best_epoch,
+        "best_val_acc": best_acc,
+        "best_val_loss": best.get("val_loss"),
+        "history": history,
+        "cpu_seconds": cpu_before + time.process_time() - cpu0,
+        "wall_seconds": time.perf_counter() - wall0,
+        "checkpoint": str(job_dir / "best_chess_model.pth"),
+    }
+    result_path.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    return result
+
+
+def aggregate(results: list[dict], grid: list[dict]) -> list[dict]:
+    rows = []
+    for point in grid:
+        runs = sorted((r for r in results if r["point"] == point), key=lambda r: r["fold"])
+        accs = [r["best_val_acc"] for r in runs]
+        losses = [r["best_val_loss"] for r in runs if r["best_val_loss"] is not None]
+        rows.append(
+            {
+                "point": point,
+                "folds": len(runs),
+                "val_acc_mean": statistics.fmean(accs) if accs else 0.0,
+                "val_acc_std": statistics.pstdev(accs) if len(accs) > 1 else 0.0,
+                "val_loss_mean": statistics.fmean(losses) if losses else None,
+                "per_fold_val_acc": {r["fold"]: r["best_val_acc"] for r in runs},
+                "cpu_seconds": sum(r["cpu_seconds"] for r in runs),
+            }
+        )
+    rows.sort(key=lambda r: r["val_acc_mean"], reverse=True)
+    return rows
+
+
+def run_cv(
+    grid: list[dict],
+    n_splits: int,
+    epochs: int,
+    patience: int,
+    workers: int,
+    threads_per_worker: int,
+    out_dir: Path,
+    resume: bool,
+    max_games: int | None,
+    seed: int,
+    board_features: str = "none",
+) -> dict:
+    n_examples = len(build_dataset(max_games, board_features))
+    folds = list(TimeSeriesSplit(n_splits=n_splits).split(range(n_examples)))
+
+    t0 = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(threads_per_worker, max_games, board_features)
+    ) as pool:
+        futures = {}
+        for fold, (train_idx, val_idx) in enumerate(folds, start=1):
+            for point in grid:
+                job_dir = out_dir / f"fold{fold}" / point_name(point)
+                fut = pool.submit(
+                    train_job,
+                    fold,
+                    train_idx.tolist(),
+                    val_idx.tolist(),
+                    point,
+                    epochs,
+                    patience,
+                    str(job_dir),
+                    resume,
+                    seed,
+                    board_features,
+                )
+                futures[fut] = (fold, point)
+        for fut in as_completed(futures):
+            r = fut.result()
+            results.append(r)
+            print(
+                f"fold {r['fold']} {point_name(r['point'])}: best val acc {r['best_val_acc']:.3f}"
+                f" @ epoch {r['best_epoch']}/{r['epochs_run']}{' (early stop)' if r['stopped_early'] else ''}"
+            )
+    wall = time.perf_counter() - t0
+
+    cpu_seconds = sum(r["cpu_seconds"] for r in results)
+    summary = aggregate(results, grid)
+    return {
+        "examples": n_examples,
+        "folds": n_splits,
+        "grid_points": len(grid),
+        "jobs": len(results),
+        "best": summary[0] if summary else None,
+        "summary": summary,
+        "jobs_detail": sorted(results, key=lambda r: (point_name(r["point"]), r["fold"])),
+        "wall_seconds": wall,
+        "cpu_hours": cpu_seconds / 3600,
+        "config": {
+            "epochs": epochs,
+            "patience": patience,
+            "workers": workers,
+            "threads_per_worker": threads_per_worker,
+            "max_games": max_games,
+            "board_features": board_features,
+            "out_dir": str(out_dir),
+            "seed": seed,
+            "revision": git_revision(),
+        },
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Parallel TimeSeriesSplit cross-validation of ChessRNN")
+    parser.add_argument("--grid", nargs="*", default=[], help="key=v1,v2 ... (model dims, optimizer)")
+    parser.add_argument("--folds", type=int, default=N_SPLITS)
+    parser.add_argument("--epochs", type=int, default=NUM_EPOCHS)
+    parser.add_argument("--patience", type=int, default=PATIENCE, help="epochs without val acc improvement")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads per worker; 0 = split cores")
+    parser.add_argument("--out-dir", type=Path, default=CV_DIR)
+    parser.add_argument("--resume", action="store_true", help="reuse finished jobs, continue unfinished ones")
+    parser.add_argument("--max-games", type=int, help="only the oldest N games (smoke runs)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--board-features",
+        choices=("none", "pieces", "attacks"),
+        default="none",
+        help="add the features.py board encoding as a model input (attacks = with attack planes)",
+    )
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    report = run_cv(
+        parse_grid(args.grid),
+        args.folds,
+        args.epochs,
+        args.patience,
+        args.workers,
+        threads,
+        args.out_dir,
+        args.resume,
+        args.max_games,
+        args.seed,
+        args.board_features,
+    )
+
+    best = report["best"]
+    if best:
+        print(
+            f"Best: {point_name(best['point'])}"
+            f"  val acc {best['val_acc_mean']:.3f} ± {best['val_acc_std']:.3f}"
+            f" over {best['folds']} folds"
+        )
+    print(f"{report['jobs']} jobs, {report['wall_seconds']:.0f}s wall, {report['cpu_hours']:.2f} CPU-hours")
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 from pathlib import Path
 
-from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel, Session, create_engine, select
 
 from . import models  # ensure tables are registered
+from .pgn_store import compress_pgn
 
 BASE_DIR = Path(__file__).resolve().parent
 DB_PATH = BASE_DIR / "leaderboard.db"
@@ -15,6 +17,29 @@ engine = create_engine(sqlite_url, echo=False, connect_args=connect_args)
 
 def create_db_and_tables() -> None:
     SQLModel.metadata.create_all(engine)
+    migrate_pgn_column()
+
+
+def migrate_pgn_column(batch_size: int = 500) -> None:
+    # databases created before pgn_z: add the column, then compress plain-text PGNs into it
+    columns = {c["name"] for c in inspect(engine).get_columns("game")}
+    with engine.begin() as conn:
+        if "pgn_z" not in columns:
+            conn.execute(text("ALTER TABLE game ADD COLUMN pgn_z BLOB"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_game_played_at ON game (played_at)"))
+
+    with Session(engine) as session:
+        while True:
+            games = session.exec(
+                select(models.Game).where(models.Game.pgn.is_not(None)).limit(batch_size)
+            ).all()
+            if not games:
+                break
+            for game in games:
+                game.pgn_z = compress_pgn(game.pgn)
+                game.pgn = None
+                session.add(game)
+            session.commit()
 
 
 def get_session():
@@ -0,0 +1,243 @@
+"""Knowledge distillation of the serving ChessRNN into a compact student
+
+The student is a ChessRNN with smaller embeddings, one narrower GRU layer, no
+fc_intermediate and a low-rank (factorized) output head. It trains on the
+teacher's (optionally temperature-softened) distribution over the game corpus,
+with --alpha < 1 blending in the real next move, and is saved as a plain state_dict that load_profile_files
+picks up as `student_chess_model.pth` next to the teacher. A `.json` beside it
+records the teacher's weights_version; a student of other weights is not served.
+
+The teacher sees what it sees when serving: its full context (a transformer
+reads the whole game) and, if it was trained with them, board features. The
+student reads the last MAX_SEQ_LEN plies of the same examples.
+
+The report compares student and teacher on the most recent games (held out
+from training): parameters, file size, single-request and batched latency,
+top-k agreement with the teacher and accuracy on the real moves.
+
+Example:
+    python -m src.distill --epochs 8 --out src/student_chess_model.pth --report distill.json
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader
+
+from . import app as engine
+from .corpus import load_games, plies_to_tokens
+from .features import game_features
+from .stats import git_revision
+from .training import BATCH_SIZE, MAX_LR, WEIGHT_DECAY, make_examples
+
+STUDENT_CONFIG = {
+    "embedding_dim": 64,
+    "side_dim": 16,
+    "hidden_dim": 128,
+    "num_layers": 1,
+    "dropout": 0.1,
+    "intermediate": False,
+    "head_rank": 64,
+}
+EPOCHS = 8
+KD_TEMPERATURE = 1.0
+KD_ALPHA = 1.0  # weight of the soft (teacher) loss; below 1 blends in the real next move
+HOLDOUT = 0.1
+LATENCY_ROUNDS = 200
+
+
+def distill_loss(student_logits, teacher_logits, targets, temperature: float, alpha: float):
+    soft = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1),
+        F.log_softmax(teacher_logits / temperature, dim=1),
+        reduction="batchmean",
+        log_target=True,
+    ) * (temperature**2)
+    hard = F.cross_entropy(student_logits, targets)
+    return alpha * soft + (1 - alpha) * hard
+
+
+def forward(net, colors, moves, theory, boards=None):
+    """Run any serving model on a batch built for the teacher's context and features"""
+    if isinstance(net, engine.ChessRNN):
+        keep = -engine.MAX_SEQ_LEN
+        colors, moves, theory = colors[:, keep:], moves[:, keep:], theory[:, keep:]
+        if net.board_proj is not None:
+            return net(colors, moves, theory, boards)
+    return net(colors, moves, theory)
+
+
+def distill_epoch(student, teacher, dataloader, optimizer, scheduler, temperature, alpha) -> float:
+    student.train()
+    total = 0.0
+    for *inputs, targets in dataloader:
+        inputs = [x.to(engine.device) for x in inputs]
+        targets = targets.to(engine.device)
+        with torch.no_grad():
+            teacher_logits = forward(teacher, *inputs)
+
+        optimizer.zero_grad()
+        loss = distill_loss(forward(student, *inputs), teacher_logits, targets, temperature, alpha)
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(student.parameters(), max_norm=1.0)
+        optimizer.step()
+        scheduler.step()
+        total += loss.item()
+    return total / max(1, len(dataloader))
+
+
+def agreement(student, teacher, dataloader) -> dict:
+    """Top-k agreement with the teacher and accuracy on the real next move"""
+    student.eval()
+    n = top1 = teacher_in_top5 = overlap5 = student_acc = teacher_acc = 0
+    with torch.no_grad():
+        for *inputs, targets in dataloader:
+            inputs = [x.to(engine.device) for x in inputs]
+            targets = targets.to(engine.device)
+            s_top = forward(student, *inputs).topk(5, dim=1).indices
+            t_top = forward(teacher, *inputs).topk(5, dim=1).indices
+
+            n += targets.size(0)
+            top1 += (s_top[:, 0] == t_top[:, 0]).sum().item()
+            teacher_in_top5 += (s_top == t_top[:, :1]).any(dim=1).sum().item()
+            overlap5 += (s_top.unsqueeze(2) == t_top.unsqueeze(1)).any(dim=2).sum().item()
+            student_acc += (s_top[:, 0] == targets).sum().item()
+            teacher_acc += (t_top[:, 0] == targets).sum().item()
+    n = max(1, n)
+    return {
+        "positions": n,
+        "top1_agreement": top1 / n,
+        "teacher_top1_in_student_top5": teacher_in_top5 / n,
+        "top5_overlap": overlap5 / (5 * n),
+        "student_top1_accuracy": student_acc / n,
+        "teacher_top1_accuracy": teacher_acc / n,
+    }
+
+
+def _latency_ms(net, batch) -> float:
+    with torch.no_grad():
+        for _ in range(10):
+            forward(net, *batch)
+        times = []
+        for _ in range(LATENCY_ROUNDS):
+            t0 = time.perf_counter()
+            forward(net, *batch)
+            times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+
+def model_report(net, path: Path, dataset) -> dict:
+    one = tuple(t[:1].to(engine.device) for t in dataset.tensors[:-1])
+    batch = tuple(t[:BATCH_SIZE].to(engine.device) for t in dataset.tensors[:-1])
+    return {
+        "parameters": sum(p.numel() for p in net.parameters()),
+        "file_bytes": path.stat().st_size,
+        "latency_ms_batch1": _latency_ms(net, one),
+        f"latency_ms_batch{BATCH_SIZE}": _latency_ms(net, batch),
+    }
+
+
+def run(epochs: int, out: Path, temperature: float, alpha: float, seed: int) -> dict:
+    torch.manual_seed(seed)
+    profile = engine.default_profile
+    teacher = profile.model
+    teacher.eval()
+    vocab_size = teacher.fc.out_features
+    board_features = isinstance(teacher, engine.ChessRNN) and teacher.board_proj is not None
+
+    games = load_games()
+    split = int(len(games) * (1 - HOLDOUT))
+
+    def examples(gs):
+        tokens = [plies_to_tokens(p, engine.move_to_number, engine.PAD_TOKEN) for _, p in gs]
+        features = None
+        if board_features:
+            features = [game_features([san for _, san, _ in p], teacher.board_attacks) for _, p in gs]
+        return make_examples(tokens, features, profile.context_len)
+
+    train_ds, val_ds = examples(games[:split]), examples(games[split:])
+    train_loader = DataLoader(train_ds, batch_size=BATCH_SIZE, shuffle=True)
+    val_loader = DataLoader(val_ds, batch_size=BATCH_SIZE * 16)
+
+    student = engine.ChessRNN(vocab_size=vocab_size, **STUDENT_CONFIG).to(engine.device)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=MAX_LR, weight_decay=WEIGHT_DECAY)
+    scheduler = torch.optim.lr_scheduler.OneCycleLR(
+        optimizer, max_lr=MAX_LR, epochs=epochs, steps_per_epoch=len(train_loader)
+    )
+
+    t0 = time.perf_counter()
+    history = []
+    for epoch in range(epochs):
+        loss = distill_epoch(student, teacher, train_loader, optimizer, scheduler, temperature, alpha)
+        agree = agreement(student, teacher, val_loader)
+        history.append({"epoch": epoch + 1, "loss": loss, **agree})
+        print(
+            f"Epoch {epoch + 1}/{epochs} | KD Loss: {loss:.4f}"
+            f" | Top-1 agree: {agree['top1_agreement']:.3f}, Top-5 overlap: {agree['top5_overlap']:.3f}"
+        )
+    wall = time.perf_counter() - t0
+
+    student.eval()
+    torch.save(student.state_dict(), out)
+    meta = {"teacher_weights_version": profile.weights_version, "teacher": str(engine.MODEL_PATH)}
+    out.with_suffix(".json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    # the export must load exactly as the server will load it
+    reloaded = engine.model_from_state(torch.load(out, map_location=engine.device))
+
+    return {
+        "student_config": STUDENT_CONFIG,
+        "temperature": temperature,
+        "alpha": alpha,
+        "epochs": epochs,
+        "train_examples": len(train_ds),
+        "holdout_examples": len(val_ds),
+        "wall_seconds": wall,
+        "history": history,
+        "teacher": model_report(teacher, engine.MODEL_PATH, val_ds),
+        "student": model_report(reloaded, out, val_ds),
+        "agreement": agreement(reloaded, teacher, val_loader),
+        "out": str(out),
+        "teacher_weights_version": profile.weights_version,
+        "revision": git_revision(),
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Distill the serving ChessRNN into a compact student")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--temperature", type=float, default=KD_TEMPERATURE)
+    parser.add_argument("--alpha", type=float, default=KD_ALPHA)
+    parser.add_argument("--out", type=Path, default=engine.STUDENT_MODEL_PATH)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads; 0 = torch default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    report = run(args.epochs, args.out, args.temperature, args.alpha, args.seed)
+
+    t, s = report["teacher"], report["student"]
+    print(f"Parameters: teacher {t['parameters']:,}  student {s['parameters']:,}")
+    print(f"File size:  teacher {t['file_bytes']:,} B  student {s['file_bytes']:,} B")
+    print(f"Latency:    teacher {t['latency_ms_batch1']:.3f} ms  student {s['latency_ms_batch1']:.3f} ms (batch 1)")
+    a = report["agreement"]
+    print(
+        f"Agreement:  top-1 {a['top1_agreement']:.3f}  teacher top-1 in student top-5"
+        f" {a['teacher_top1_in_student_top5']:.3f}  top-5 overlap {a['top5_overlap']:.3f}"
+    )
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Offline evaluation of ChessRNN and of the full serving policy
+
+The held-out set is the most recent slice of cleaned_data.csv (file order is time
+order, as in the notebook's TimeSeriesSplit). Games are sharded across a process
+pool and each worker runs large-batch inference over its shard.
+
+Reported:
+  * top-1 / top-5 next-move accuracy of the raw model (notebook encoding)
+  * vocab coverage: share of legal moves and of targets that have a move id
+  * policy agreement on TEORIAT's own moves: raw model restricted to legal
+    moves, and pick_legal_move after heuristics and sampling
+
+Example:
+    python -m src.evaluate --holdout 0.2 --workers 8 --out eval.json
+"""
+
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+import torch
+
+from .corpus import history_window, load_games, plies_to_tokens
+
+HOLDOUT = 0.2
+BATCH_SIZE = 1024
+
+_COUNTERS = (
+    "positions",
+    "top1",
+    "top5",
+    "legal_moves",
+    "legal_in_vocab",
+    "targets_in_vocab",
+    "teoriat_positions",
+    "raw_policy_agree",
+    "heuristic_policy_agree",
+)
+
+
+def _init_worker(threads: int, weights: str | None):
+    torch.set_num_threads(threads)
+    if weights:
+        from . import app as engine
+
+        # any saved model shape, so distilled students and transformers evaluate the same way
+        net = engine.model_from_state(torch.load(weights, map_location=engine.device))
+        engine.default_profile.model = engine.model = net
+        engine.default_profile.context_len = engine.context_len_for(net)
+
+
+def _batched_logits(engine, windows: list, boards: list, batch_size: int):
+    for i in range(0, len(windows), batch_size):
+        yield i, engine.model_logits_batch(windows[i : i + batch_size], boards=boards[i : i + batch_size])
+
+
+def evaluate_shard(games: list, batch_size: int, heuristic: bool, seed: int) -> dict:
+    """Counters for one shard of (game_id, plies)"""
+    from . import app as engine
+
+    random.seed(seed)
+    torch.manual_seed(seed)
+    counts = dict.fromkeys(_COUNTERS, 0)
+    context_len = engine.default_profile.context_len
+
+    data_windows, data_boards, targets = [], [], []
+    serve_windows, policy = [], []  # policy: (board, actual move, actual san, legal san -> id)
+
+    for _, plies in games:
+        tokens = plies_to_tokens(plies, engine.move_to_number, engine.PAD_TOKEN)
+        serve_tokens = [(c, m, 0) for c, m, _ in tokens]  # /move always sends theory=0
+        board = chess.Board()
+        for j, (_, san, is_teoriat) in enumerate(plies):
+            try:
+                mv = board.parse_san(san)
+            except ValueError:
+                break
+
+            if j > 0:
+                data_windows.append(history_window(tokens, j, context_len, engine.PAD_TOKEN))
+                data_boards.append(board.copy(stack=False))
+                targets.append(tokens[j][1])
+
+            legal_ids = {}
+            for m in board.legal_moves:
+                legal_san = board.san(m)
+                legal_ids[legal_san] = engine.move_to_number.get(legal_san)
+            counts["legal_moves"] += len(legal_ids)
+            counts["legal_in_vocab"] += sum(1 for v in legal_ids.values() if v is not None)
+
+            if is_teoriat:
+                serve_windows.append(history_window(serve_tokens, j, context_len, engine.PAD_TOKEN))
+                policy.append((board.copy(), mv, san, legal_ids))
+
+            board.push(mv)
+
+    targets_t = torch.tensor(targets, dtype=torch.long)
+    for i, logits in _batched_logits(engine, data_windows, data_boards, batch_size):
+        tgt = targets_t[i : i + logits.shape[0]]
+        top5 = torch.topk(logits, k=5, dim=1).indices
+        counts["top1"] += int((top5[:, 0] == tgt).sum())
+        counts["top5"] += int((top5 == tgt[:, None]).any(dim=1).sum())
+    counts["positions"] = len(targets)
+    counts["targets_in_vocab"] = sum(1 for t in targets if t != engine.PAD_TOKEN)
+
+    counts["teoriat_positions"] = len(policy)
+    for i, logits in _batched_logits(engine, serve_windows, [p[0] for p in policy], batch_size):
+        for k in range(logits.shape[0]):
+            board, actual, actual_san, legal_ids = policy[i + k]
+            row = logits[k]
+            scored = [(float(row[v]), s) for s, v in legal_ids.items() if v is not None]
+            # compare scores only; a tuple max would break ties by SAN string
+            if scored and max(scored, key=lambda x: x[0])[1] == actual_san:
+                counts["raw_policy_agree"] += 1
+            if heuristic and engine.pick_legal_move(board, logits[k : k + 1]) == actual:
+                counts["heuristic_policy_agree"] += 1
+
+    return counts
+
+
+def holdout_games(fraction: float) -> list:
+    games = load_games()
+    start = int(len(games) * (1.0 - fraction))
+    return games[start:]
+
+
+def run_evaluation(
+    fraction: float = HOLDOUT,
+    workers: int = 1,
+    threads_per_worker: int = 1,
+    batch_size: int = BATCH_SIZE,
+    heuristic: bool = True,
+    weights: str | None = None,
+    seed: int = 0,
+) -> dict:
+    games = holdout_games(fraction)
+    shards = [games[i::workers] for i in range(workers)]
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(threads_per_worker, weights)
+    ) as pool:
+        parts = list(
+            pool.map(
+                evaluate_shard,
+                shards,
+                [batch_size] * workers,
+                [heuristic] * workers,
+                [seed + i for i in range(workers)],
+            )
+        )
+    wall = time.perf_counter() - t0
+
+    c = {k: sum(p[k] for p in parts) for k in _COUNTERS}
+
+    def ratio(a: str, b: str) -> float:
+        return c[a] / c[b] if c[b] else 0.0
+
+    return {
+        "games": len(games),
+        "positions": c["positions"],
+        "teoriat_positions": c["teoriat_positions"],
+        "top1": ratio("top1", "positions"),
+        "top5": ratio("top5", "positions"),
+        "legal_vocab_coverage": ratio("legal_in_vocab", "legal_moves"),
+        "target_vocab_coverage": ratio("targets_in_vocab", "positions"),
+        "raw_policy_agreement": ratio("raw_policy_agree", "teoriat_positions"),
+        "heuristic_policy_agreement": ratio("heuristic_policy_agree", "teoriat_positions") if heuristic else None,
+        "wall_seconds": wall,
+        "positions_per_sec": c["positions"] / wall if wall > 0 else 0.0,
+        "config": {
+            "holdout": fraction,
+            "workers": workers,
+            "threads_per_worker": threads_per_worker,
+            "batch_size": batch_size,
+            "weights": weights,
+            "seed": seed,
+        },
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Evaluate TEORIAT move prediction on held-out games")
+    parser.add_argument("--holdout", type=float, default=HOLDOUT, help="most recent fraction of games")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=1, help="torch threads per worker")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--weights", help="state_dict to evaluate instead of best_chess_model.pth")
+    parser.add_argument("--no-heuristic", action="store_true", help="skip the pick_legal_move pass")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    report = run_evaluation(
+        fraction=args.holdout,
+        workers=args.workers,
+        threads_per_worker=args.threads,
+        batch_size=args.batch_size,
+        heuristic=not args.no_heuristic,
+        weights=args.weights,
+        seed=args.seed,
+    )
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
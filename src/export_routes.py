@@ -0,0 +1,95 @@
+import json
+from datetime import datetime
+from enum import Enum
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select
+
+from .db import engine
+from .models import Game, Mode
+from .pgn_store import decompress_pgn
+
+router = APIRouter(tags=["export"])
+
+EXPORT_BATCH = 500
+CHUNK_BYTES = 64 * 1024
+
+
+class ExportFormat(str, Enum):
+    pgn = "pgn"
+    ndjson = "ndjson"
+
+
+def _pgn_record(row) -> str:
+    game_id, player_name, result, mode, played_at, pgn = row
+    if pgn:
+        return pgn.strip() + "\n\n"
+    # games posted without moves still export as a header-only PGN
+    return (
+        f'[Event "TEORIAT {mode.value}"]\n'
+        f'[Site "TEORIAT"]\n'
+        f'[Date "{played_at:%Y.%m.%d}"]\n'
+        f'[Player "{player_name}"]\n'
+        f'[PlayerResult "{result.value}"]\n'
+        f'[GameId "{game_id}"]\n\n*\n\n'
+    )
+
+
+def _ndjson_record(row) -> str:
+    game_id, player_name, result, mode, played_at, pgn = row
+    return json.dumps(
+        {
+            "id": game_id,
+            "player_name": player_name,
+            "result": result.value,
+            "mode": mode.value,
+            "played_at": played_at.isoformat(),
+            "pgn": pgn,
+        }
+    ) + "\n"
+
+
+def _stream(stmt, fmt: ExportFormat):
+    render = _pgn_record if fmt == ExportFormat.pgn else _ndjson_record
+    # own session: the response outlives the request's dependencies
+    with Session(engine) as session:
+        rows = session.exec(stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH))
+        buf: list[str] = []
+        size = 0
+        for game_id, player_name, result, mode, played_at, pgn_z in rows:
+            text = render((game_id, player_name, result, mode, played_at, decompress_pgn(pgn_z)))
+            buf.append(text)
+            size += len(text)
+            if size >= CHUNK_BYTES:
+                yield "".join(buf).encode("utf-8")
+                buf, size = [], 0
+        if buf:
+            yield "".join(buf).encode("utf-8")
+
+
+@router.get("/games/export")
+def export_games(
+    format: ExportFormat = ExportFormat.ndjson,
+    player: str | None = None,
+    mode: Mode | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    stmt = select(Game.id, Game.player_name, Game.result, Game.mode, Game.played_at, Game.pgn_z)
+    if player:
+        stmt = stmt.where(Game.player_name == player.strip())
+    if mode:
+        stmt = stmt.where(Game.mode == mode)
+    if since:
+        stmt = stmt.where(Game.played_at >= since)
+    if until:
+        stmt = stmt.where(Game.played_at < until)
+    stmt = stmt.order_by(Game.played_at, Game.id)
+
+    media_type = "application/x-chess-pgn" if format == ExportFormat.pgn else "application/x-ndjson"
+    return StreamingResponse(
+        _stream(stmt, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="games.{format.value}"'},
+    )
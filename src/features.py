@@ -0,0 +1,101 @@
+"""Board-state features for the move model, encoded from python-chess bitboards
+
+Per position the encoder reads a handful of 64-bit masks and bytes from the
+board, and NumPy bit-unpacks a whole batch at once:
+
+    12 x 64   piece planes: white P N B R Q K, then black p n b r q k
+     2 x 64   (attacks=True) squares attacked by white, by black
+     1        side to move (1 = white)
+     4        castling rights K Q k q
+     8        en-passant file, one-hot (all 0 = none)
+
+Plane bit i is square i (a1 = 0, h8 = 63), python-chess's square order. Rows
+are uint8 0/1; the model casts them to float. The same functions build the
+training examples (game_features) and the /move input (encode_boards).
+"""
+
+import chess
+import numpy as np
+
+PIECE_PLANES = 12
+ATTACK_PLANES = 2
+EXTRA_FEATURES = 1 + 4 + 8
+
+_PIECE_ORDER = tuple(
+    (color, piece_type) for color in (chess.WHITE, chess.BLACK) for piece_type in chess.PIECE_TYPES
+)
+_CASTLING = (chess.BB_H1, chess.BB_A1, chess.BB_H8, chess.BB_A8)
+_EP_ONE_HOT = np.eye(9, dtype=np.uint8)[:, 1:]  # row 0 = no en-passant square
+
+
+def feature_dim(attacks: bool = False) -> int:
+    return 64 * (PIECE_PLANES + (ATTACK_PLANES if attacks else 0)) + EXTRA_FEATURES
+
+
+def attacks_for_dim(dim: int) -> bool:
+    """Which layout a model's board input width was trained on"""
+    if dim not in (feature_dim(False), feature_dim(True)):
+        raise ValueError(f"no board feature layout is {dim} wide")
+    return dim == feature_dim(True)
+
+
+def attacked_mask(board: chess.Board, color: chess.Color) -> int:
+    mask = 0
+    for sq in chess.scan_forward(board.occupied_co[color]):
+        mask |= board.attacks_mask(sq)
+    return mask
+
+
+def _raw(board: chess.Board, attacks: bool) -> tuple[list[int], int]:
+    # the only per-position Python work: masks plus one packed flags/ep-file int
+    masks = [board.pieces_mask(piece_type, color) for color, piece_type in _PIECE_ORDER]
+    if attacks:
+        masks.append(attacked_mask(board, chess.WHITE))
+        masks.append(attacked_mask(board, chess.BLACK))
+    flags = 1 if board.turn == chess.WHITE else 0
+    for i, bb in enumerate(_CASTLING, start=1):
+        if board.castling_rights & bb:
+            flags |= 1 << i
+    ep = chess.square_file(board.ep_square) + 1 if board.ep_square is not None else 0
+    return masks, flags | (ep << 5)
+
+
+def _encode_raw(raw: list[tuple[list[int], int]], attacks: bool) -> np.ndarray:
+    n = len(raw)
+    if n == 0:
+        return np.zeros((0, feature_dim(attacks)), dtype=np.uint8)
+    masks = np.array([m for m, _ in raw], dtype="<u8")
+    planes = np.unpackbits(masks.view(np.uint8), axis=1, bitorder="little")
+
+    packed = np.array([f for _, f in raw], dtype=np.uint16)
+    flags = np.unpackbits((packed & 0x1F).astype(np.uint8)[:, None], axis=1, bitorder="little")[:, :5]
+    ep = _EP_ONE_HOT[packed >> 5]
+    return np.concatenate([planes, flags, ep], axis=1)
+
+
+def encode_boards(boards: list[chess.Board], attacks: bool = False) -> np.ndarray:
+    """[len(boards), feature_dim(attacks)] uint8"""
+    return _encode_raw([_raw(b, attacks) for b in boards], attacks)
+
+
+def encode_board(board: chess.Board, attacks: bool = False) -> np.ndarray:
+    return encode_boards([board], attacks)[0]
+
+
+def game_features(sans: list[str], attacks: bool = False) -> np.ndarray:
+    """Features of the position before each ply of a SAN game.
+
+    Rows after the first unplayable move stay zero, matching plies_to_uci,
+    which stops there.
+    """
+    board = chess.Board()
+    raw = []
+    for san in sans:
+        raw.append(_raw(board, attacks))
+        try:
+            board.push_san(san)
+        except ValueError:
+            break
+    out = np.zeros((len(sans), feature_dim(attacks)), dtype=np.uint8)
+    out[: len(raw)] = _encode_raw(raw, attacks)
+    return out
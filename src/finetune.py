@@ -0,0 +1,308 @@
+"""Continual fine-tuning of ChessRNN on games ingested since the last checkpoint
+
+Checkpoints are versioned under src/checkpoints/vNNNN/ (weights, vocab, the ids
+of every game covered, and a report). The first run records the current
+serving model as v0000 covering the games already present, so only later
+ingests count as new.
+
+The vocab is append-only: existing move ids never change and unseen SAN moves
+get fresh ids after PAD_TOKEN, growing the embedding and output layers.
+
+Validation uses the newest of the new games, or, when there are fewer than
+MIN_NEW_VAL_GAMES of them, the most recent already-covered games (kept out of
+the replay sample). A version is published only if validation accuracy did
+not drop.
+
+Example:
+    python -m src.finetune --source db --epochs 3 --replay 1.0 --install
+"""
+
+import argparse
+import json
+import random
+import shutil
+import time
+from pathlib import Path
+
+import torch
+from torch.utils.data import ConcatDataset, DataLoader
+
+from .app import (
+    MODEL_PATH,
+    MOVE_TO_NUMBER_PATH,
+    PAD_TOKEN,
+    ChessTransformer,
+    device,
+    model_from_state,
+)
+from .corpus import BASE_DIR, load_games, load_games_from_db, plies_to_tokens
+from .features import game_features
+from .training import BATCH_SIZE, NUM_EPOCHS, WEIGHT_DECAY, make_examples, train_epoch, validate
+from .transformer import make_sequences, run_epoch
+
+CHECKPOINT_DIR = BASE_DIR / "checkpoints"
+FINETUNE_EPOCHS = 3
+FINETUNE_LR = 0.0001
+REPLAY_RATIO = 1.0
+VAL_FRACTION = 0.1
+MIN_NEW_VAL_GAMES = 10
+
+
+def latest_version(root: Path = CHECKPOINT_DIR) -> Path | None:
+    latest = root / "LATEST"
+    if not latest.exists():
+        return None
+    return root / latest.read_text(encoding="utf-8").strip()
+
+
+def read_version(path: Path) -> tuple[dict, dict[str, int], set[str]]:
+    state = torch.load(path / "best_chess_model.pth", map_location=device)
+    with (path / "move_to_number.json").open("r", encoding="utf-8") as f:
+        vocab = json.load(f)
+    games = set((path / "games.txt").read_text(encoding="utf-8").split())
+    return state, vocab, games
+
+
+def write_version(
+    root: Path,
+    state: dict,
+    vocab: dict[str, int],
+    games: set[str],
+    report: dict,
+) -> Path:
+    """Write the next vNNNN directory and point LATEST at it once it is complete"""
+    root.mkdir(parents=True, exist_ok=True)
+    existing = sorted(p.name for p in root.glob("v[0-9][0-9][0-9][0-9]"))
+    name = f"v{int(existing[-1][1:]) + 1:04d}" if existing else "v0000"
+
+    tmp = root / f".{name}.tmp"
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir()
+    torch.save(state, tmp / "best_chess_model.pth")
+    with (tmp / "move_to_number.json").open("w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    (tmp / "games.txt").write_text("\n".join(sorted(games)), encoding="utf-8")
+    with (tmp / "report.json").open("w", encoding="utf-8") as f:
+        json.dump({**report, "version": name}, f, indent=2)
+    tmp.rename(root / name)
+
+    (root / "LATEST.tmp").write_text(name, encoding="utf-8")
+    (root / "LATEST.tmp").replace(root / "LATEST")
+    return root / name
+
+
+def extend_vocab(vocab: dict[str, int], games: list) -> dict[str, int]:
+    """Append ids for SAN moves not seen before, in first-seen order (deterministic)"""
+    out = dict(vocab)
+    next_id = max(max(out.values()) + 1, PAD_TOKEN + 1)
+    for _, plies in games:
+        for _, san, _ in plies:
+            if san not in out:
+                out[san] = next_id
+                next_id += 1
+    return out
+
+
+def grow_state(state: dict, vocab_size: int) -> dict:
+    """Pad embedding / output rows up to vocab_size; new moves start out unlikely"""
+    old = state["fc.weight"].shape[0]
+    if vocab_size <= old:
+        return state
+    extra = vocab_size - old
+    state = dict(state)
+
+    emb = state["move_embedding.weight"]
+    state["move_embedding.weight"] = torch.cat([emb, torch.randn(extra, emb.shape[1]) * 0.02])
+
+    fc_w = state["fc.weight"]
+    state["fc.weight"] = torch.cat([fc_w, torch.zeros(extra, fc_w.shape[1])])
+    fc_b = state["fc.bias"]
+    state["fc.bias"] = torch.cat([fc_b, fc_b.min().expand(extra)])
+    return state
+
+
+def run_finetune(
+    source: str = "csv",
+    epochs: int = FINETUNE_EPOCHS,
+    lr: float = FINETUNE_LR,
+    replay: float = REPLAY_RATIO,
+    val_fraction: float = VAL_FRACTION,
+    root: Path = CHECKPOINT_DIR,
+    seed: int = 0,
+) -> dict | None:
+    torch.manual_seed(seed)
+    rng = random.Random(seed)
+    games = load_games_from_db() if source == "db" else load_games()
+
+    base = latest_version(root)
+    if base is None:
+        # first run: the serving model is the baseline and covers everything present now
+        state = torch.load(MODEL_PATH, map_location=device)
+        with MOVE_TO_NUMBER_PATH.open("r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        path = write_version(
+            root, state, vocab, {g for g, _ in games}, {"bootstrap": True, "games": len(games)}
+        )
+        print(f"Recorded {path.name} as baseline covering {len(games)} games")
+        return None
+
+    state, vocab, seen = read_version(base)
+    new_games = [g for g in games if g[0] not in seen]
+    old_games = [g for g in games if g[0] in seen]
+    if not new_games:
+        print(f"No new games since {base.name}")
+        return None
+
+    base_vocab_len = len(vocab)
+    vocab = extend_vocab(vocab, new_games)
+    vocab_size = max(max(vocab.values()), PAD_TOKEN) + 1
+    state = grow_state(state, vocab_size)
+
+    # newest games are validation, the rest plus a replay sample is training;
+    # validating on the games just trained on would make the gate below meaningless
+    if len(new_games) >= MIN_NEW_VAL_GAMES:
+        n_val = max(1, int(len(new_games) * val_fraction))
+        train_new, val_games = new_games[:-n_val], new_games[-n_val:]
+        replay_pool, validation = old_games, "new"
+    else:
+        n_val = max(1, int(len(old_games) * val_fraction)) if old_games else 0
+        train_new, val_games = new_games, old_games[len(old_games) - n_val :]
+        replay_pool, validation = old_games[: len(old_games) - n_val], "covered"
+    if not val_games:
+        print("No games to validate on; not publishing")
+        return None
+
+    # any saved model shape: students, low-rank heads, board features, transformers
+    model = model_from_state(state)
+    is_transformer = isinstance(model, ChessTransformer)
+
+    def dataset(gs):
+        tokens = [plies_to_tokens(p, vocab, PAD_TOKEN) for _, p in gs]
+        if is_transformer:
+            return make_sequences(tokens, model.max_len, PAD_TOKEN)
+        features = None
+        if model.board_proj is not None:
+            features = [game_features([san for _, san, _ in p], model.board_attacks) for _, p in gs]
+        return make_examples(tokens, features)
+
+    new_ds = dataset(train_new)
+    replay_games = rng.sample(replay_pool, min(len(replay_pool), int(len(train_new) * replay)))
+    replay_ds = dataset(replay_games)
+    val_ds = dataset(val_games)
+    train_ds = ConcatDataset([new_ds, replay_ds]) if len(replay_ds) else new_ds
+
+    loss_func = torch.nn.CrossEntropyLoss()
+    train_loader = DataLoader(train_ds, batch_size=BATCH_SIZE, shuffle=True)
+    val_loader = DataLoader(val_ds, batch_size=BATCH_SIZE * 16)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=WEIGHT_DECAY)
+
+    def train_pass():
+        if is_transformer:
+            return run_epoch(model, train_loader, device, optimizer)
+        return train_epoch(model, train_loader, optimizer, loss_func, device)
+
+    def val_pass():
+        if is_transformer:
+            return run_epoch(model, val_loader, device)
+        return validate(model, val_loader, loss_func, device)
+
+    _, val_acc_before = val_pass()
+
+    t0 = time.perf_counter()
+    history = []
+    for epoch in range(epochs):
+        train_loss, train_acc = train_pass()
+        val_loss, val_acc = val_pass()
+        history.append(
+            {
+                "epoch": epoch + 1,
+                "train_loss": train_loss,
+                "train_acc": train_acc,
+                "val_loss": val_loss,
+                "val_acc": val_acc,
+            }
+        )
+        print(
+            f"Epoch {epoch + 1}/{epochs} | Train Loss: {train_loss:.4f}, Acc: {train_acc:.3f}"
+            f" | Val Loss: {val_loss:.4f}, Acc: {val_acc:.3f}"
+        )
+    wall = time.perf_counter() - t0
+
+    examples_seen = sum(max(0, len(p) - 1) for _, p in train_new + replay_games) * epochs
+    examples_per_sec = examples_seen / wall if wall > 0 else 0.0
+    # a full retrain is the notebook's NUM_EPOCHS over every game at the same throughput
+    full_examples = sum(max(0, len(p) - 1) for _, p in games) * NUM_EPOCHS
+    full_estimate = full_examples / examples_per_sec if examples_per_sec else 0.0
+
+    report = {
+        "base_version": base.name,
+        "new_games": len(new_games),
+        "replay_games": len(replay_games),
+        "new_vocab_entries": len(vocab) - base_vocab_len,
+        "vocab_size": vocab_size,
+        "train_examples": examples_seen // max(1, epochs),
+        "epochs": epochs,
+        "validation": validation,
+        "val_games": len(val_games),
+        "val_acc_before": val_acc_before,
+        "val_acc_after": history[-1]["val_acc"] if history else val_acc_before,
+        "history": history,
+        "wall_seconds": wall,
+        "examples_per_sec": examples_per_sec,
+        "full_retrain_examples": full_examples,
+        "full_retrain_estimate_seconds": full_estimate,
+        "speedup_vs_full_retrain": full_estimate / wall if wall > 0 else 0.0,
+    }
+    report["accepted"] = report["val_acc_after"] >= val_acc_before
+    if not report["accepted"]:
+        return report
+    path = write_version(root, model.state_dict(), vocab, seen | {g for g, _ in new_games}, report)
+    report["version"] = path.name
+    return report
+
+
+def install(version: Path):
+    """Copy a checkpoint over the files the server loads at startup"""
+    shutil.copyfile(version / "best_chess_model.pth", MODEL_PATH)
+    shutil.copyfile(version / "move_to_number.json", MOVE_TO_NUMBER_PATH)
+    with (version / "move_to_number.json").open("r", encoding="utf-8") as f:
+        vocab = json.load(f)
+    with (MOVE_TO_NUMBER_PATH.parent / "number_to_move.json").open("w", encoding="utf-8") as f:
+        json.dump({str(v): k for k, v in vocab.items()}, f)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Fine-tune ChessRNN on newly ingested games")
+    parser.add_argument("--source", choices=("csv", "db"), default="csv")
+    parser.add_argument("--epochs", type=int, default=FINETUNE_EPOCHS)
+    parser.add_argument("--lr", type=float, default=FINETUNE_LR)
+    parser.add_argument("--replay", type=float, default=REPLAY_RATIO, help="old games per new game")
+    parser.add_argument("--val-fraction", type=float, default=VAL_FRACTION)
+    parser.add_argument("--checkpoints", type=Path, default=CHECKPOINT_DIR)
+    parser.add_argument("--install", action="store_true", help="copy the new version into src/ for serving")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = run_finetune(
+        source=args.source,
+        epochs=args.epochs,
+        lr=args.lr,
+        replay=args.replay,
+        val_fraction=args.val_fraction,
+        root=args.checkpoints,
+        seed=args.seed,
+    )
+    if report is None:
+        return
+    print(json.dumps({k: v for k, v in report.items() if k != "history"}, indent=2))
+    if not report["accepted"]:
+        print("Validation accuracy dropped; nothing published")
+        return
+    if args.install:
+        install(args.checkpoints / report["version"])
+        print(f"Installed {report['version']} into {MODEL_PATH.parent}")
+
+
+if __name__ == "__main__":
+    main()
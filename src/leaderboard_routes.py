@@ -6,6 +6,7 @@ from sqlmodel import Session, select, func, case
 
 from .db import get_session
 from .models import Game, Result, Mode
+from .pgn_store import compress_pgn
 
 router = APIRouter(tags=["leaderboard"])
 
@@ -37,7 +38,7 @@ def create_game(payload: GameCreate, session: Session = Depends(get_session)):
         player_name=name,
         result=payload.result,
         mode=payload.mode,
-        pgn=payload.pgn,
+        pgn_z=compress_pgn(payload.pgn),
         played_at=datetime.now(timezone.utc),
     )
     session.add(game)
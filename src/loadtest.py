@@ -0,0 +1,221 @@
+"""Replay-driven load generator for POST /move
+
+Requests are built from real game prefixes in cleaned_data.csv. By default the
+app is driven in-process through httpx's ASGI transport; pass --url to hit a
+running server or --spawn to start a local uvicorn for the run.
+
+Example:
+    python -m src.loadtest --requests 2000 --concurrency 32 --rate 50 --zero-think --out load.json
+
+Overload check: --compare-admission runs the same workload with the admission
+controller off and on, so the p99s and quality tiers can be read side by side:
+    python -m src.loadtest --requests 3000 --concurrency 256 --rate 400 --zero-think --compare-admission
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .corpus import load_games, plies_to_uci
+from .stats import git_revision, latency_summary
+
+MODES = ("bullet", "rapid")
+SPAWN_PORT = 8765
+
+
+def build_workload(n: int, modes: tuple[str, ...], seed: int) -> list[dict]:
+    """n /move payloads, each a random prefix of a real game ending before its last ply"""
+    rng = random.Random(seed)
+    games = [uci for uci in (plies_to_uci(p) for _, p in load_games()) if len(uci) > 1]
+    payloads = []
+    for _ in range(n):
+        uci = games[rng.randrange(len(games))]
+        cut = rng.randrange(len(uci))
+        payloads.append({"moves": uci[:cut], "mode": rng.choice(modes)})
+    return payloads
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    payloads: list[dict],
+    concurrency: int,
+    rate: float,
+    seed: int,
+) -> dict:
+    """Send payloads with at most `concurrency` in flight.
+
+    rate > 0 gives open-loop Poisson arrivals at that many requests/sec,
+    otherwise each slot fires its next request as soon as the previous returns.
+    """
+    rng = random.Random(seed)
+    sem = asyncio.Semaphore(concurrency)
+    samples: list[tuple[str, float, int | None, str | None]] = []
+
+    async def one(payload: dict):
+        arrived = time.perf_counter()
+        async with sem:
+            # open loop counts queueing from arrival (no coordinated omission)
+            t0 = arrived if rate > 0 else time.perf_counter()
+            tier = None
+            try:
+                resp = await client.post("/move", json=payload)
+                status = resp.status_code
+                if status == 200:
+                    tier = resp.json().get("tier")
+            except httpx.HTTPError:
+                status = None
+            samples.append((payload["mode"], time.perf_counter() - t0, status, tier))
+
+    t_start = time.perf_counter()
+    tasks = []
+    for payload in payloads:
+        if rate > 0:
+            await asyncio.sleep(rng.expovariate(rate))
+        tasks.append(asyncio.create_task(one(payload)))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - t_start
+
+    per_mode = {}
+    for mode in sorted({m for m, _, _, _ in samples}):
+        rows = [(lat, st, tier) for m, lat, st, tier in samples if m == mode]
+        ok = [lat for lat, st, _ in rows if st == 200]
+        statuses: dict[str, int] = {}
+        tiers: dict[str, int] = {}
+        for _, st, tier in rows:
+            statuses[str(st)] = statuses.get(str(st), 0) + 1
+            if tier:
+                tiers[tier] = tiers.get(tier, 0) + 1
+        per_mode[mode] = {
+            **latency_summary(ok),
+            "requests": len(rows),
+            "error_rate": 1.0 - len(ok) / len(rows),
+            "statuses": statuses,
+            "tiers": tiers,
+        }
+
+    ok_total = sum(1 for _, _, st, _ in samples if st == 200)
+    return {
+        "requests": len(samples),
+        "wall_seconds": wall,
+        "throughput_rps": ok_total / wall if wall > 0 else 0.0,
+        "error_rate": 1.0 - ok_total / len(samples) if samples else 0.0,
+        "modes": per_mode,
+    }
+
+
+def in_process_client(zero_think: bool, admission: bool = True) -> httpx.AsyncClient:
+    from . import app as app_module
+
+    if zero_think:
+        app_module.THINK_TIME_SCALE = 0.0
+    app_module.admission.enabled = admission
+    # the ASGI transport sends no startup event, so seed the tier costs here
+    app_module.calibrate_admission()
+    transport = httpx.ASGITransport(app=app_module.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None)
+
+
+def spawn_server(zero_think: bool, port: int, admission: bool = True) -> subprocess.Popen:
+    env = dict(os.environ)
+    if zero_think:
+        env["TEORIAT_THINK_SCALE"] = "0"
+    if not admission:
+        env["TEORIAT_ADMISSION"] = "0"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.app:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.25)
+    proc.terminate()
+    raise SystemExit("uvicorn did not come up within 60s")
+
+
+async def _run_once(args, payloads: list[dict], admission: bool) -> dict:
+    proc = None
+    if args.spawn:
+        proc = spawn_server(args.zero_think, args.port, admission)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None)
+        target = f"uvicorn:{args.port}"
+    elif args.url:
+        # the remote server controls its own think time (TEORIAT_THINK_SCALE)
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+        target = args.url
+    else:
+        client = in_process_client(args.zero_think, admission)
+        target = "asgi"
+
+    try:
+        async with client:
+            report = await run_load(client, payloads, args.concurrency, args.rate, args.seed)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    report["config"] = {
+        "target": target,
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "zero_think": args.zero_think,
+        "admission": admission,
+        "seed": args.seed,
+        "revision": git_revision(),
+    }
+    return report
+
+
+async def _main(args) -> dict:
+    payloads = build_workload(args.requests, tuple(args.modes), args.seed)
+    if not args.compare_admission:
+        return await _run_once(args, payloads, not args.no_admission)
+    # --url cannot toggle the remote server, so both runs need a local app
+    if args.url:
+        raise SystemExit("--compare-admission needs the in-process app or --spawn")
+    return {
+        "without_admission": await _run_once(args, payloads, False),
+        "with_admission": await _run_once(args, payloads, True),
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="TEORIAT /move load test")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=0.0, help="arrivals/sec; 0 = closed loop")
+    parser.add_argument("--modes", nargs="+", default=list(MODES))
+    parser.add_argument("--zero-think", action="store_true", help="disable the min_think_seconds delay")
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--spawn", action="store_true", help="start a local uvicorn for the run")
+    parser.add_argument("--port", type=int, default=SPAWN_PORT)
+    parser.add_argument("--no-admission", action="store_true", help="serve every request at full quality")
+    parser.add_argument(
+        "--compare-admission", action="store_true", help="run the workload with admission control off, then on"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(_main(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
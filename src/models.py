@@ -2,6 +2,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional
 
+from sqlalchemy import Column, LargeBinary
 from sqlmodel import SQLModel, Field
 
 
@@ -21,5 +22,6 @@ class Game(SQLModel, table=True):
     player_name: str = Field(index=True)
     result: Result
     mode: Mode
-    pgn: Optional[str] = None
-    played_at: datetime
+    pgn: Optional[str] = None  # legacy plain text, moved into pgn_z on startup
+    pgn_z: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))  # see pgn_store.py
+    played_at: datetime = Field(index=True)
@@ -0,0 +1,147 @@
+"""Compressed PGN storage
+
+Stored blobs start with one format byte so dictionaries can change without
+rewriting old rows:
+
+    0  raw UTF-8 (used when compression would not help)
+    1  zlib (deflate) primed with pgn_dict_v1.bin
+
+The dictionary is built from real games by `python -m src.pgn_store`: the most
+frequent header lines and move-text fragments, most frequent last since
+deflate reaches the end of the window most cheaply.
+"""
+
+import argparse
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import chess
+import chess.pgn
+
+BASE_DIR = Path(__file__).resolve().parent
+DICT_VERSION = 1
+DICT_PATHS = {1: BASE_DIR / "pgn_dict_v1.bin"}
+DICT_SIZE = 32 * 1024  # deflate's window, larger dictionaries are ignored
+
+_dicts: dict[int, bytes] = {}
+
+
+def _dictionary(version: int) -> bytes:
+    if version not in _dicts:
+        _dicts[version] = DICT_PATHS[version].read_bytes()
+    return _dicts[version]
+
+
+def compress_pgn(pgn: str | None) -> bytes | None:
+    if pgn is None:
+        return None
+    raw = pgn.encode("utf-8")
+    comp = zlib.compressobj(level=9, zdict=_dictionary(DICT_VERSION))
+    packed = comp.compress(raw) + comp.flush()
+    if len(packed) >= len(raw):
+        return b"\x00" + raw
+    return bytes([DICT_VERSION]) + packed
+
+
+def decompress_pgn(blob: bytes | None) -> str | None:
+    if blob is None:
+        return None
+    blob = bytes(blob)
+    version, body = blob[0], blob[1:]
+    if version == 0:
+        return body.decode("utf-8")
+    decomp = zlib.decompressobj(zdict=_dictionary(version))
+    return (decomp.decompress(body) + decomp.flush()).decode("utf-8")
+
+
+def build_dictionary(pgns: list[str], size: int = DICT_SIZE) -> bytes:
+    """Greedy dictionary of frequent lines and 3-token move-text fragments"""
+    counts: Counter[str] = Counter()
+    for pgn in pgns:
+        for line in pgn.splitlines():
+            if line.startswith("["):
+                counts[line + "\n"] += 1
+                # tag name with the value left open also repeats across games
+                counts[line.split('"', 1)[0] + '"'] += 1
+            else:
+                tokens = line.split()
+                for i in range(len(tokens) - 2):
+                    counts[" ".join(tokens[i : i + 3]) + " "] += 1
+
+    # worth = bytes saved across the corpus; keep the best that fit
+    ranked = sorted(counts.items(), key=lambda kv: kv[1] * len(kv[0]), reverse=True)
+    chosen, used = [], 0
+    for text, n in ranked:
+        if n < 2:
+            continue
+        b = text.encode("utf-8")
+        if used + len(b) > size:
+            continue
+        chosen.append((n * len(b), b))
+        used += len(b)
+    chosen.sort()
+    return b"".join(b for _, b in chosen)
+
+
+def corpus_pgns() -> list[str]:
+    """Render cleaned_data.csv games as Chess.com-style PGN text"""
+    from .corpus import load_games, plies_to_uci
+
+    out = []
+    for game_id, plies in load_games():
+        board = chess.Board()
+        for uci in plies_to_uci(plies):
+            board.push_uci(uci)
+        game = chess.pgn.Game.from_board(board)
+        teoriat_white = bool(plies) and plies[0][2]
+        game.headers["Event"] = "Live Chess"
+        game.headers["Site"] = "Chess.com"
+        game.headers["White"] = "teoriat" if teoriat_white else "opponent"
+        game.headers["Black"] = "opponent" if teoriat_white else "teoriat"
+        game.headers["Link"] = f"https://www.chess.com/game/live/{game_id}"
+        out.append(str(game))
+    return out
+
+
+def db_pgns() -> list[str]:
+    import psycopg2
+
+    from .tables import DB_CONFIG
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute("SELECT pgn FROM chess_games WHERE pgn IS NOT NULL")
+    pgns = [r[0] for r in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return pgns
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Build the shared PGN compression dictionary")
+    parser.add_argument("--source", choices=("csv", "db"), default="csv")
+    parser.add_argument("--out", type=Path, help="defaults to the next pgn_dict_vN.bin")
+    args = parser.parse_args(argv)
+
+    pgns = db_pgns() if args.source == "db" else corpus_pgns()
+    # train on the older 80%, report on the rest
+    split = int(len(pgns) * 0.8)
+    zdict = build_dictionary(pgns[:split])
+    out = args.out or BASE_DIR / f"pgn_dict_v{max(DICT_PATHS) + 1}.bin"
+    out.write_bytes(zdict)
+
+    held = pgns[split:]
+    raw = sum(len(p.encode("utf-8")) for p in held)
+    plain = sum(len(zlib.compress(p.encode("utf-8"), 9)) for p in held)
+    primed = 0
+    for p in held:
+        comp = zlib.compressobj(level=9, zdict=zdict)
+        primed += len(comp.compress(p.encode("utf-8")) + comp.flush())
+    print(f"Wrote {len(zdict)} byte dictionary to {out}")
+    print(f"Held-out {len(held)} games: raw {raw:,} B, zlib {plain:,} B, zlib+dict {primed:,} B")
+    print("Register the file in DICT_PATHS and bump DICT_VERSION to start using it.")
+
+
+if __name__ == "__main__":
+    main()
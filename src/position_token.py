@@ -0,0 +1,135 @@
+"""Signed, stateless position tokens for /move
+
+A token lets a client skip resending and re-validating the whole game. It
+carries, under an HMAC-SHA256 tag:
+
+  * the profile name and a fingerprint of its vocab (stale after a vocab change)
+  * the position at the last irreversible move, packed (positions.py), plus the
+    moves played since then, so repetition checks still see the full relevant
+    history (the tail is bounded by the fifty-move rule, not the game length)
+  * the encoded model window (move ids, colours, theory flags)
+
+Anything that fails to verify or decode returns None and the caller falls
+back to full replay.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import struct
+
+import chess
+
+from .positions import pack_board, unpack_board
+
+TOKEN_VERSION = 2
+TAG_BYTES = 16
+MAX_TAIL = 255
+MAX_WINDOW = 255  # the window length is stored in one byte
+
+# unset = per-process random key, so tokens die with the process (safe default)
+_SECRET = os.environ.get("TEORIAT_TOKEN_SECRET", "").encode("utf-8") or os.urandom(32)
+
+
+def pack_move(mv: chess.Move) -> int:
+    """Move as u16: from square, to square, promotion piece type"""
+    return mv.from_square | (mv.to_square << 6) | ((mv.promotion or 0) << 12)
+
+
+def unpack_move(v: int) -> chess.Move:
+    return chess.Move(v & 63, (v >> 6) & 63, (v >> 12) or None)
+
+
+def pack_window(window: tuple[list[int], list[int], list[int]]) -> bytes:
+    """Model window as u16 move ids, then colour and theory bitfields; shared with warm_cache"""
+    colors, moves, theory = window
+    flag_bytes = (len(moves) + 7) // 8
+    color_bits = sum(1 << i for i, c in enumerate(colors) if c).to_bytes(flag_bytes, "little")
+    theory_bits = sum(1 << i for i, t in enumerate(theory) if t).to_bytes(flag_bytes, "little")
+    return struct.pack(f"<{len(moves)}H", *moves) + color_bits + theory_bits
+
+
+def unpack_window(data: bytes, n: int) -> tuple[list[int], list[int], list[int]]:
+    """Inverse of pack_window for an n-ply window; ValueError if data is not exactly that"""
+    flag_bytes = (n + 7) // 8
+    if len(data) != 2 * n + 2 * flag_bytes:
+        raise ValueError("packed window has the wrong length")
+    moves = list(struct.unpack_from(f"<{n}H", data, 0))
+    color_bits = int.from_bytes(data[2 * n : 2 * n + flag_bytes], "little")
+    theory_bits = int.from_bytes(data[2 * n + flag_bytes :], "little")
+    colors = [(color_bits >> i) & 1 for i in range(n)]
+    theory = [(theory_bits >> i) & 1 for i in range(n)]
+    return colors, moves, theory
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(_SECRET, payload, hashlib.sha256).digest()[:TAG_BYTES]
+
+
+def encode_token(
+    board: chess.Board,
+    window: tuple[list[int], list[int], list[int]],
+    profile: str,
+    vocab_version: int,
+) -> str:
+    tail = min(board.halfmove_clock, len(board.move_stack), MAX_TAIL)
+    recent = board.copy(stack=tail)
+    root = pack_board(recent.root())
+    name = profile.encode("utf-8")
+
+    payload = b"".join(
+        [
+            struct.pack("<BB", TOKEN_VERSION, len(name)),
+            name,
+            struct.pack("<IB", vocab_version, len(root)),
+            root,
+            struct.pack(f"<B{tail}H", tail, *(pack_move(m) for m in recent.move_stack)),
+            struct.pack("<B", len(window[1])),
+            pack_window(window),
+        ]
+    )
+    return base64.urlsafe_b64encode(payload + _sign(payload)).decode("ascii").rstrip("=")
+
+
+def decode_token(
+    token: str, profile: str, vocab_version: int, max_seq_len: int
+) -> tuple[chess.Board, tuple[list[int], list[int], list[int]]] | None:
+    """(board with repetition history, model window) or None if invalid/stale"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except ValueError:
+        return None
+    if len(raw) <= TAG_BYTES:
+        return None
+    payload, tag = raw[:-TAG_BYTES], raw[-TAG_BYTES:]
+    if not hmac.compare_digest(tag, _sign(payload)):
+        return None
+
+    try:
+        version, name_len = struct.unpack_from("<BB", payload, 0)
+        off = 2
+        name = payload[off : off + name_len].decode("utf-8")
+        off += name_len
+        token_vocab, root_len = struct.unpack_from("<IB", payload, off)
+        off += 5
+        if version != TOKEN_VERSION or name != profile or token_vocab != vocab_version:
+            return None
+
+        board = unpack_board(payload[off : off + root_len])
+        off += root_len
+        (tail,) = struct.unpack_from("<B", payload, off)
+        off += 1
+        for v in struct.unpack_from(f"<{tail}H", payload, off):
+            board.push(unpack_move(v))
+        off += 2 * tail
+
+        (n,) = struct.unpack_from("<B", payload, off)
+        off += 1
+        if n != max_seq_len:
+            return None
+        window = unpack_window(payload[off:], n)
+    except (struct.error, UnicodeDecodeError, ValueError):
+        return None
+
+    return board, window
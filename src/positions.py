@@ -0,0 +1,98 @@
+"""Compact binary position encoding for game_moves
+
+A position is stored as a 64-bit polyglot Zobrist key (indexed, for lookups)
+plus a packed board:
+
+    8 bytes   occupancy bitboard
+    n/2 bytes one 4-bit piece code per occupied square, in square order
+    1 byte    side to move (bit 7), castling KQkq (bits 3..0)
+    1 byte    en-passant file + 1 (0 = none)
+    1 byte    halfmove clock (capped at 255)
+    2 bytes   fullmove number
+
+A full 32-piece position is 29 bytes against ~60 characters of FEN, and only
+the position *before* each ply is stored since the one after it is the next
+row's. FEN is rebuilt on demand with unpack_board(...).fen().
+"""
+
+import struct
+
+import chess
+import chess.polyglot
+
+_CASTLING = (
+    (chess.BB_H1, 0b1000),
+    (chess.BB_A1, 0b0100),
+    (chess.BB_H8, 0b0010),
+    (chess.BB_A8, 0b0001),
+)
+
+
+def zobrist_key(board: chess.Board) -> int:
+    """Polyglot Zobrist hash as a signed 64-bit int (Postgres BIGINT)"""
+    key = chess.polyglot.zobrist_hash(board)
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def _piece_code(piece: chess.Piece) -> int:
+    # 1..6 white, 9..14 black
+    return piece.piece_type | (0 if piece.color == chess.WHITE else 8)
+
+
+def pack_board(board: chess.Board) -> bytes:
+    occupied = board.occupied
+    codes = [_piece_code(board.piece_at(sq)) for sq in chess.scan_forward(occupied)]
+    if len(codes) % 2:
+        codes.append(0)
+    pieces = bytes((codes[i] << 4) | codes[i + 1] for i in range(0, len(codes), 2))
+
+    flags = 0x80 if board.turn == chess.WHITE else 0
+    for bb, bit in _CASTLING:
+        if board.castling_rights & bb:
+            flags |= bit
+    ep = chess.square_file(board.ep_square) + 1 if board.ep_square is not None else 0
+
+    return (
+        struct.pack("<Q", occupied)
+        + pieces
+        + struct.pack("<BBBH", flags, ep, min(board.halfmove_clock, 255), board.fullmove_number)
+    )
+
+
+def unpack_board(data: bytes) -> chess.Board:
+    (occupied,) = struct.unpack_from("<Q", data, 0)
+    squares = list(chess.scan_forward(occupied))
+    n_bytes = (len(squares) + 1) // 2
+
+    board = chess.Board(None)
+    for i, sq in enumerate(squares):
+        byte = data[8 + i // 2]
+        code = byte >> 4 if i % 2 == 0 else byte & 0x0F
+        board.set_piece_at(sq, chess.Piece(code & 7, chess.WHITE if code < 8 else chess.BLACK))
+
+    flags, ep, halfmove, fullmove = struct.unpack_from("<BBBH", data, 8 + n_bytes)
+    board.turn = chess.WHITE if flags & 0x80 else chess.BLACK
+    board.castling_rights = 0
+    for bb, bit in _CASTLING:
+        if flags & bit:
+            board.castling_rights |= bb
+    if ep:
+        rank = 5 if board.turn == chess.WHITE else 2
+        board.ep_square = chess.square(ep - 1, rank)
+    board.halfmove_clock = halfmove
+    board.fullmove_number = fullmove
+    return board
+
+
+def fen_of(data: bytes) -> str:
+    return unpack_board(bytes(data)).fen()
+
+
+def same_position(data: bytes, board: chess.Board) -> bool:
+    """Whether a packed board is the position `board` is in, as the Zobrist key sees it.
+
+    Only placement, side to move, castling and a *legal* en-passant square
+    count; clocks and python-chess's raw ep_square (set after every double
+    push) do not, so transpositions match.
+    """
+    return unpack_board(bytes(data)).epd() == board.epd()
@@ -0,0 +1,247 @@
+"""On-demand profiler for the /move pipeline
+
+Disarmed, the only cost on the request path is reading `profiler.armed`.
+Once armed (for N requests and/or T seconds), a background thread samples the
+Python stacks of threads currently inside a profiled section. The same thread
+holds one torch.profiler session for the whole capture, recording the ops of
+every thread, so no request pays to start or stop a profiler. Both aggregate
+into collapsed stacks ("a;b;c weight") that flamegraph.pl, speedscope or
+inferno can load directly.
+
+On a torch without all-thread profiling, torch.profiler falls back to wrapping
+each model forward, and stack samples skip threads inside it so the profiler
+does not show up in its own flame graph.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import torch
+
+
+def _all_threads_config():
+    """torch.profiler config recording every thread, or None if this torch can't"""
+    try:
+        return torch.profiler._ExperimentalConfig(profile_all_threads=True)
+    except (AttributeError, TypeError):
+        return None
+
+
+_ALL_THREADS = _all_threads_config()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class MoveProfiler:
+    def __init__(self):
+        self.armed = False
+        self._lock = threading.Lock()
+        self._active: dict[int, int] = {}  # thread id -> nesting depth
+        self._in_model: set[int] = set()  # threads inside a per-forward torch.profiler
+        self._stacks: Counter[str] = Counter()
+        self._torch_ops: Counter[str] = Counter()
+        self._torch_busy = threading.Lock()
+        self._sampler: threading.Thread | None = None
+        self._last_sampler: threading.Thread | None = None
+        self._remaining: int | None = None
+        self._deadline: float | None = None
+        self.interval = 0.002
+        self.torch_enabled = True
+        self.requests_profiled = 0
+        self.samples = 0
+        self.started_at: float | None = None
+
+    def arm(
+        self,
+        requests: int | None = None,
+        seconds: float | None = None,
+        interval: float = 0.002,
+        torch_enabled: bool = True,
+    ):
+        """Start a fresh capture; it stops after `requests` requests or `seconds`, whichever is first"""
+        with self._lock:
+            self.disarm_locked()
+        # the previous sampler must close its torch.profiler session before a new one opens
+        self._wait_for_sampler()
+        with self._lock:
+            self._stacks.clear()
+            self._torch_ops.clear()
+            self.requests_profiled = 0
+            self.samples = 0
+            self._remaining = requests
+            self._deadline = time.monotonic() + seconds if seconds else None
+            self.interval = max(0.0005, interval)
+            self.torch_enabled = torch_enabled
+            self.started_at = time.time()
+            self.armed = True
+            self._sampler = self._last_sampler = threading.Thread(
+                target=self._sample_loop, name="move-profiler", daemon=True
+            )
+            self._sampler.start()
+
+    def disarm(self):
+        with self._lock:
+            self.disarm_locked()
+
+    def disarm_locked(self):
+        self.armed = False
+        self._sampler = None
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn with this thread's stack sampled; counts as one profiled request"""
+        tid = threading.get_ident()
+        with self._lock:
+            self._active[tid] = self._active.get(tid, 0) + 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                depth = self._active.pop(tid) - 1
+                if depth:
+                    self._active[tid] = depth
+                self.requests_profiled += 1
+                if self._remaining is not None:
+                    self._remaining -= 1
+                    if self._remaining <= 0:
+                        self.disarm_locked()
+
+    def _wait_for_sampler(self, timeout: float = 5.0):
+        sampler = self._last_sampler
+        if sampler is not None and sampler is not threading.current_thread():
+            sampler.join(timeout)
+
+    def run_model(self, fn, *args, **kwargs):
+        """Call fn (a model forward); without all-thread profiling, under its own torch.profiler"""
+        if _ALL_THREADS is not None or not self.torch_enabled or not self._torch_busy.acquire(blocking=False):
+            return fn(*args, **kwargs)
+        tid = threading.get_ident()
+        with self._lock:
+            self._in_model.add(tid)
+        try:
+            with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU]) as prof:
+                out = fn(*args, **kwargs)
+            ops = Counter()
+            for evt in prof.key_averages():
+                ops[evt.key] += int(evt.self_cpu_time_total)
+            with self._lock:
+                self._torch_ops.update(ops)
+            return out
+        finally:
+            with self._lock:
+                self._in_model.discard(tid)
+            self._torch_busy.release()
+
+    def _sample_loop(self):
+        session = None
+        if self.torch_enabled and _ALL_THREADS is not None:
+            # started and stopped on this thread: torch.profiler requires both on the same one
+            session = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU], experimental_config=_ALL_THREADS
+            )
+            session.start()
+        try:
+            self._sample_until_disarmed()
+        finally:
+            if session is not None:
+                session.stop()
+                ops = Counter()
+                for evt in session.key_averages():
+                    ops[evt.key] += int(evt.self_cpu_time_total)
+                with self._lock:
+                    self._torch_ops.update(ops)
+
+    def _sample_until_disarmed(self):
+        me = threading.current_thread()
+        stop_code = MoveProfiler.run.__code__
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self.armed or self._sampler is not me:
+                    return
+                if self._deadline is not None and time.monotonic() >= self._deadline:
+                    self.disarm_locked()
+                    return
+                active = [tid for tid in self._active if tid not in self._in_model]
+            if not active:
+                continue
+
+            frames = sys._current_frames()
+            stacks = []
+            for tid in active:
+                frame = frames.get(tid)
+                labels = []
+                while frame is not None and frame.f_code is not stop_code:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if labels:
+                    stacks.append(";".join(reversed(labels)))
+            with self._lock:
+                for s in stacks:
+                    # weight in microseconds so torch ops and samples share a unit
+                    self._stacks[s] += int(self.interval * 1e6)
+                self.samples += len(stacks)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "armed": self.armed,
+                "started_at": self.started_at,
+                "requests_profiled": self.requests_profiled,
+                "remaining_requests": self._remaining,
+                "seconds_left": (
+                    max(0.0, self._deadline - time.monotonic()) if self.armed and self._deadline else None
+                ),
+                "samples": self.samples,
+                "interval_ms": self.interval * 1000,
+                "torch": self.torch_enabled,
+            }
+
+    def collapsed(self) -> str:
+        if not self.armed:
+            # torch ops land when the sampler closes its session
+            self._wait_for_sampler()
+        with self._lock:
+            lines = [f"{stack} {w}" for stack, w in self._stacks.most_common()]
+            lines += [f"torch;{op.replace(';', ':')} {us}" for op, us in self._torch_ops.most_common() if us]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> dict:
+        """speedscope 'sampled' profile; weights are microseconds"""
+        frames: list[dict] = []
+        index: dict[str, int] = {}
+        samples, weights = [], []
+        for line in self.collapsed().splitlines():
+            stack, _, weight = line.rpartition(" ")
+            ids = []
+            for name in stack.split(";"):
+                if name not in index:
+                    index[name] = len(frames)
+                    frames.append({"name": name})
+                ids.append(index[name])
+            samples.append(ids)
+            weights.append(int(weight))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": "TEORIAT /move",
+                    "unit": "microseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+            "name": "TEORIAT /move",
+            "exporter": "teoriat-profiler",
+        }
+
+
+profiler = MoveProfiler()
@@ -0,0 +1,177 @@
+"""Memory-bounded LRU of lazily loaded per-player engine profiles"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+class _Pending:
+    # one in-flight load that concurrent callers wait on
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+class _Entry:
+    def __init__(self, value: Any, nbytes: int, load_seconds: float):
+        self.value = value
+        self.nbytes = nbytes
+        self.load_seconds = load_seconds
+        self.hits = 0
+        self.last_used = time.time()
+
+
+class ModelRegistry:
+    """Profiles are loaded on first use and evicted least-recently-used once the
+    total size passes max_bytes. Concurrent first requests for one name share a
+    single load. Pinned names are never evicted. A load that fails with one of
+    remember_errors is re-raised without retrying for error_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Any],
+        sizeof: Callable[[Any], int],
+        max_bytes: int,
+        remember_errors: tuple[type[BaseException], ...] = (),
+        error_ttl: float = 30.0,
+    ):
+        self._loader = loader
+        self._sizeof = sizeof
+        self.max_bytes = max_bytes
+        self._remember_errors = remember_errors
+        self.error_ttl = error_ttl
+        self._failed: dict[str, tuple[BaseException, float]] = {}  # name -> (error, retry at)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._loading: dict[str, _Pending] = {}
+        self._pinned: set[str] = set()
+        self.loads = 0
+        self.evictions = 0
+
+    def pin(self, name: str, value: Any):
+        """Register an already-loaded profile that must stay resident"""
+        with self._lock:
+            self._entries[name] = _Entry(value, self._sizeof(value), 0.0)
+            self._pinned.add(name)
+
+    def peek(self, name: str) -> Any | None:
+        """Resident value, without counting a hit or touching the LRU order"""
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry.value if entry is not None else None
+
+    def _hit(self, name: str) -> Any | None:
+        # caller holds the lock
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        self._entries.move_to_end(name)
+        entry.hits += 1
+        entry.last_used = time.time()
+        return entry.value
+
+    def _failure(self, name: str) -> BaseException | None:
+        # caller holds the lock
+        failed = self._failed.get(name)
+        if failed is None:
+            return None
+        if time.monotonic() >= failed[1]:
+            del self._failed[name]
+            return None
+        return failed[0]
+
+    def get(self, name: str) -> Any:
+        with self._lock:
+            value = self._hit(name)
+            if value is not None:
+                return value
+            error = self._failure(name)
+            if error is not None:
+                raise error.with_traceback(None)
+            pending = self._loading.get(name)
+            owner = pending is None
+            if owner:
+                pending = _Pending()
+                self._loading[name] = pending
+
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            with self._lock:
+                self._hit(name)
+            return pending.value
+
+        t0 = time.perf_counter()
+        try:
+            value = self._loader(name)
+            nbytes = self._sizeof(value)
+        except BaseException as e:
+            pending.error = e
+            with self._lock:
+                if isinstance(e, self._remember_errors):
+                    self._failed[name] = (e, time.monotonic() + self.error_ttl)
+                del self._loading[name]
+            pending.event.set()
+            raise
+
+        with self._lock:
+            entry = _Entry(value, nbytes, time.perf_counter() - t0)
+            entry.hits = 1
+            self._entries[name] = entry
+            self.loads += 1
+            self._evict(keep=name)
+            self._failed.pop(name, None)
+            del self._loading[name]
+        pending.value = value
+        pending.event.set()
+        return value
+
+    async def aget(self, name: str) -> Any:
+        """get() for the event loop: hits and remembered failures return inline, misses load in a worker thread"""
+        with self._lock:
+            value = self._hit(name)
+            error = self._failure(name) if value is None else None
+        if value is not None:
+            return value
+        if error is not None:
+            raise error.with_traceback(None)
+        return await asyncio.to_thread(self.get, name)
+
+    def _evict(self, keep: str):
+        # caller holds the lock
+        total = sum(e.nbytes for e in self._entries.values())
+        for name in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep or name in self._pinned:
+                continue
+            total -= self._entries.pop(name).nbytes
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "resident_bytes": sum(e.nbytes for e in self._entries.values()),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "loading": sorted(self._loading),
+                "failed": {
+                    name: max(0.0, retry_at - time.monotonic()) for name, (_, retry_at) in self._failed.items()
+                },
+                "profiles": {
+                    name: {
+                        "bytes": e.nbytes,
+                        "hits": e.hits,
+                        "load_seconds": e.load_seconds,
+                        "last_used": e.last_used,
+                        "pinned": name in self._pinned,
+                    }
+                    for name, e in self._entries.items()
+                },
+            }
@@ -0,0 +1,295 @@
+"""Headless engine-vs-engine arena for tuning the pick_legal_move weights
+
+Example:
+    python -m src.selfplay --games 2000 --workers 8 \
+        --config base --config "sharp:w_check=250,temperature=0.7"
+"""
+
+import argparse
+import json
+import math
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, fields, replace
+from itertools import combinations
+
+import chess
+import torch
+
+from .app import (
+    DEFAULT_PARAMS,
+    EngineParams,
+    default_profile,
+    encode_move,
+    model_logits_batch,
+    pad_window,
+    pick_legal_move,
+)
+from .corpus import load_games, plies_to_uci
+from .stats import percentile
+
+MAX_PLIES = 200
+OPENING_PLIES = 6
+BATCH_GAMES = 64
+PSEUDO_COUNT = 0.5  # per result, for the Elo interval
+
+
+def parse_config(spec: str) -> tuple[str, EngineParams]:
+    # "name" or "name:field=value,field=value"
+    name, _, body = spec.partition(":")
+    types = {f.name: f.type for f in fields(EngineParams)}
+    overrides = {}
+    for item in filter(None, body.split(",")):
+        key, _, value = item.partition("=")
+        key = key.strip()
+        if key not in types:
+            raise SystemExit(f"unknown EngineParams field: {key}")
+        if types[key] is bool:
+            overrides[key] = value.strip().lower() in ("1", "true", "yes")
+        else:
+            overrides[key] = int(value) if types[key] is int else float(value)
+    return name.strip(), replace(DEFAULT_PARAMS, **overrides)
+
+
+def opening_book(n_plies: int) -> list[list[str]]:
+    # distinct real-game prefixes so the arena doesn't replay one line thousands of times
+    seen = set()
+    out = []
+    for _, plies in load_games():
+        prefix = tuple(plies_to_uci(plies[:n_plies]))
+        if len(prefix) == n_plies and prefix not in seen:
+            seen.add(prefix)
+            out.append(list(prefix))
+    return out or [[]]
+
+
+class _Game:
+    def __init__(self, opening: list[str], white: str, black: str):
+        self.board = chess.Board()
+        self.white = white
+        self.black = black
+        self.colors: list[int] = []
+        self.moves: list[int] = []
+        self.theory: list[int] = []
+        for uci in opening:
+            self.push(chess.Move.from_uci(uci))
+
+    def push(self, mv: chess.Move):
+        color, move_idx, th = encode_move(self.board, mv)
+        self.colors.append(color)
+        self.moves.append(move_idx)
+        self.theory.append(th)
+        self.board.push(mv)
+
+    def to_move(self) -> str:
+        return self.white if self.board.turn == chess.WHITE else self.black
+
+
+def _init_worker(threads: int):
+    torch.set_num_threads(threads)
+
+
+def play_batch(
+    games: list[tuple[list[str], str, str]],
+    configs: dict[str, dict],
+    max_plies: int,
+    seed: int,
+) -> dict:
+    """Play games in lockstep, one batched model forward per ply across all of them"""
+    random.seed(seed)
+    torch.manual_seed(seed)
+    params = {name: EngineParams(**p) for name, p in configs.items()}
+
+    active = [_Game(*g) for g in games]
+    finished: list[tuple[str, str, str]] = []
+    latency: dict[str, list[float]] = {name: [] for name in configs}
+
+    while active:
+        t0 = time.perf_counter()
+        # a transformer profile plays on the whole game, not the last MAX_SEQ_LEN plies
+        windows = [pad_window(g.colors, g.moves, g.theory, default_profile.context_len) for g in active]
+        logits = model_logits_batch(windows, boards=[g.board for g in active])
+        forward_share = (time.perf_counter() - t0) / len(active)
+
+        still = []
+        for i, g in enumerate(active):
+            name = g.to_move()
+            t1 = time.perf_counter()
+            mv = pick_legal_move(g.board, logits[i : i + 1], params=params[name])
+            latency[name].append(forward_share + time.perf_counter() - t1)
+            g.push(mv)
+
+            if g.board.is_game_over(claim_draw=True):
+                finished.append((g.white, g.black, g.board.result(claim_draw=True)))
+            elif len(g.board.move_stack) >= max_plies:
+                finished.append((g.white, g.black, "1/2-1/2"))
+            else:
+                still.append(g)
+        active = still
+
+    return {"results": finished, "latency": latency}
+
+
+def elo_with_ci(wins: int, draws: int, losses: int, z: float = 1.96) -> tuple[float, float, float]:
+    """Elo difference of the first player with a normal-approximation confidence interval.
+
+    Half a game of pseudo-count is added to each of W/D/L, so a run of identical
+    results still gets an interval of honest width. A 0% or 100% score leaves
+    that side unbounded.
+    """
+    n = wins + draws + losses
+    if n == 0:
+        return 0.0, float("-inf"), float("inf")
+
+    def to_elo(p: float) -> float:
+        if p <= 0.0:
+            return float("-inf")
+        if p >= 1.0:
+            return float("inf")
+        return 400.0 * math.log10(p / (1.0 - p))
+
+    w, d, l = wins + PSEUDO_COUNT, draws + PSEUDO_COUNT, losses + PSEUDO_COUNT
+    m = w + d + l
+    p = (w + 0.5 * d) / m
+    var = (w * (1 - p) ** 2 + d * (0.5 - p) ** 2 + l * p**2) / m
+    se = math.sqrt(var / m)
+    lo = to_elo(p - z * se) if wins + draws else float("-inf")
+    hi = to_elo(p + z * se) if draws + losses else float("inf")
+    return to_elo(p), lo, hi
+
+
+def run_arena(
+    configs: dict[str, EngineParams],
+    games_per_pair: int,
+    workers: int,
+    threads_per_worker: int = 1,
+    max_plies: int = MAX_PLIES,
+    opening_plies: int = OPENING_PLIES,
+    batch_games: int = BATCH_GAMES,
+    seed: int = 0,
+) -> dict:
+    rng = random.Random(seed)
+    openings = opening_book(opening_plies)
+
+    schedule: list[tuple[list[str], str, str]] = []
+    for a, b in combinations(configs, 2):
+        # each opening is played twice with colours swapped; an odd count drops the last swap
+        for i in range(0, games_per_pair, 2):
+            opening = openings[rng.randrange(len(openings))]
+            schedule.append((opening, a, b))
+            if i + 1 < games_per_pair:
+                schedule.append((opening, b, a))
+
+    raw = {name: asdict(p) for name, p in configs.items()}
+    chunks = [schedule[i : i + batch_games] for i in range(0, len(schedule), batch_games)]
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(threads_per_worker,)
+    ) as pool:
+        futures = [
+            pool.submit(play_batch, chunk, raw, max_plies, seed + i) for i, chunk in enumerate(chunks)
+        ]
+        parts = [f.result() for f in futures]
+    wall = time.perf_counter() - t0
+
+    latency: dict[str, list[float]] = {name: [] for name in configs}
+    results = []
+    for part in parts:
+        results.extend(part["results"])
+        for name, vals in part["latency"].items():
+            latency[name].extend(vals)
+
+    pairs = []
+    for a, b in combinations(configs, 2):
+        w = d = l = 0
+        for white, black, res in results:
+            if {white, black} != {a, b}:
+                continue
+            if res == "1/2-1/2":
+                d += 1
+            elif (res == "1-0") == (white == a):
+                w += 1
+            else:
+                l += 1
+        elo, lo, hi = elo_with_ci(w, d, l)
+        pairs.append(
+            {"a": a, "b": b, "wins": w, "draws": d, "losses": l, "elo": elo, "elo_lo": lo, "elo_hi": hi}
+        )
+
+    per_config = {
+        name: {
+            "moves": len(vals),
+            "mean_ms": statistics.fmean(vals) * 1000 if vals else 0.0,
+            "p50_ms": percentile(vals, 50) * 1000,
+            "p95_ms": percentile(vals, 95) * 1000,
+            "params": raw[name],
+        }
+        for name, vals in latency.items()
+    }
+
+    return {
+        "games": len(results),
+        "wall_seconds": wall,
+        "games_per_sec": len(results) / wall if wall > 0 else 0.0,
+        "pairs": pairs,
+        "configs": per_config,
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['games']} games in {report['wall_seconds']:.1f}s ({report['games_per_sec']:.2f} games/s)")
+    print()
+    for p in report["pairs"]:
+        print(
+            f"  {p['a']:>12s} vs {p['b']:<12s} +{p['wins']} ={p['draws']} -{p['losses']}"
+            f"  elo {p['elo']:+7.1f}  [{p['elo_lo']:+7.1f}, {p['elo_hi']:+7.1f}]"
+        )
+    print()
+    for name, c in report["configs"].items():
+        print(
+            f"  {name:>12s}: {c['moves']:>7,d} moves  mean {c['mean_ms']:6.2f}ms"
+            f"  p50 {c['p50_ms']:6.2f}ms  p95 {c['p95_ms']:6.2f}ms"
+        )
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="TEORIAT self-play arena")
+    parser.add_argument("--config", action="append", default=[], help='"name" or "name:field=value,..."')
+    parser.add_argument("--games", type=int, default=200, help="games per config pair")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=1, help="torch threads per worker")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    parser.add_argument("--opening-plies", type=int, default=OPENING_PLIES)
+    parser.add_argument("--batch-games", type=int, default=BATCH_GAMES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    specs = args.config or ["base"]
+    if len(specs) < 2:
+        specs.append("base_b")
+    configs = dict(parse_config(s) for s in specs)
+    if len(configs) < 2:
+        raise SystemExit("need at least two distinctly named configs")
+
+    report = run_arena(
+        configs,
+        games_per_pair=args.games,
+        workers=args.workers,
+        threads_per_worker=args.threads,
+        max_plies=args.max_plies,
+        opening_plies=args.opening_plies,
+        batch_games=args.batch_games,
+        seed=args.seed,
+    )
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
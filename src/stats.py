@@ -0,0 +1,35 @@
+"""Small helpers shared by the benchmarking tools"""
+
+import statistics
+import subprocess
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]; 0.0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def latency_summary(seconds: list[float]) -> dict:
+    """count/mean/p50/p95/p99 of a list of durations, reported in milliseconds"""
+    return {
+        "count": len(seconds),
+        "mean_ms": statistics.fmean(seconds) * 1000 if seconds else 0.0,
+        "p50_ms": percentile(seconds, 50) * 1000,
+        "p95_ms": percentile(seconds, 95) * 1000,
+        "p99_ms": percentile(seconds, 99) * 1000,
+    }
+
+
+def git_revision() -> str | None:
+    """Short HEAD hash so saved reports can be matched to commits"""
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
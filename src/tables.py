@@ -2,12 +2,19 @@
 
 import requests
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime
 import chess
 import chess.pgn
 import io
+import time
 from collections import Counter
 
+try:
+    from .positions import pack_board, same_position, zobrist_key
+except ImportError:  # run as a script: python src/tables.py
+    from positions import pack_board, same_position, zobrist_key
+
 # Chess.com API URLs for teoriat's games
 archives = [
     f"https://api.chess.com/pub/player/teoriat/games/{year}/{month:02d}"
@@ -60,8 +67,8 @@ def create_tables():
             move_number INT,
             player_color TEXT,
             move_san TEXT,
-            position_before TEXT,
-            position_after TEXT,
+            position_key BIGINT,     -- polyglot Zobrist hash of the position before the move
+            position BYTEA,          -- packed board before the move (see positions.py)
             is_teoriat_move BOOLEAN,
             teoriat_color TEXT
         );
@@ -79,9 +86,14 @@ def create_tables():
         );
     """)
     
+    # Tables created before packed positions get the new columns (see migrate_position_columns)
+    cursor.execute("ALTER TABLE game_moves ADD COLUMN IF NOT EXISTS position_key BIGINT")
+    cursor.execute("ALTER TABLE game_moves ADD COLUMN IF NOT EXISTS position BYTEA")
+    
     # Create indexes
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_moves_teoriat ON game_moves(is_teoriat_move);")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_moves_game ON game_moves(game_id);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_moves_position_key ON game_moves(position_key);")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_openings_freq ON opening_patterns(frequency DESC);")
     
     conn.commit()
@@ -199,7 +211,7 @@ def parse_pgn_and_store_moves(pgn_text, game_id, player_name="teoriat"):
             return True  # Already processed
         
         board = game.board()
-        moves_stored = 0
+        rows = []
         
         for i, move in enumerate(game.mainline_moves()):
             current_color = 'white' if board.turn else 'black'
@@ -207,33 +219,29 @@ def parse_pgn_and_store_moves(pgn_text, game_id, player_name="teoriat"):
             
             # SAN must be generated before pushing
             move_san = board.san(move)
-            position_before = board.fen()
-
-            # OLD BUG: board.copy().push(move).fen() -> push() returns None
-            # FIX: copy board, push, then call fen()
-            tmp_board = board.copy()
-            tmp_board.push(move)
-            position_after = tmp_board.fen()
 
-            # Store move
-            cursor.execute("""
-                INSERT INTO game_moves (
-                    game_id, move_number, player_color, move_san,
-                    position_before, position_after, is_teoriat_move, teoriat_color
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
+            # only the position before the move is stored; the one after is the next row's
+            rows.append((
                 game_id,
                 (i // 2) + 1,  # Move number
                 current_color,
                 move_san,
-                position_before,
-                position_after,
+                zobrist_key(board),
+                psycopg2.Binary(pack_board(board)),
                 is_teoriat_move,
                 teoriat_color
             ))
             
             board.push(move)
-            moves_stored += 1
+        
+        if rows:
+            execute_values(cursor, """
+                INSERT INTO game_moves (
+                    game_id, move_number, player_color, move_san,
+                    position_key, position, is_teoriat_move, teoriat_color
+                ) VALUES %s
+            """, rows)
+        moves_stored = len(rows)
         
         conn.commit()
         cursor.close()
@@ -350,6 +358,88 @@ def process_all_games():
     print("Analyzing openings...")
     analyze_and_store_openings()
 
+def migrate_position_columns(batch_size=5000, drop_fen=True):
+    """Backfill position_key/position from the old FEN columns, then drop them"""
+    conn = psycopg2.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_name = 'game_moves' AND column_name = 'position_before'
+    """)
+    if cursor.fetchone()[0] == 0:
+        print("game_moves already uses packed positions")
+        cursor.close()
+        conn.close()
+        return
+    
+    cursor.execute("SELECT pg_total_relation_size('game_moves')")
+    size_before = cursor.fetchone()[0]
+    
+    cursor.execute("ALTER TABLE game_moves ADD COLUMN IF NOT EXISTS position_key BIGINT")
+    cursor.execute("ALTER TABLE game_moves ADD COLUMN IF NOT EXISTS position BYTEA")
+    conn.commit()
+    
+    # named cursor = server-side, so the whole table never sits in memory
+    reader = conn.cursor(name="fen_backfill")
+    reader.itersize = batch_size
+    reader.execute("SELECT id, position_before FROM game_moves WHERE position IS NULL AND position_before IS NOT NULL")
+    
+    writer = conn.cursor()
+    migrated = 0
+    t0 = time.perf_counter()
+    while True:
+        batch = reader.fetchmany(batch_size)
+        if not batch:
+            break
+        updates = []
+        for row_id, fen in batch:
+            board = chess.Board(fen)
+            updates.append((row_id, zobrist_key(board), psycopg2.Binary(pack_board(board))))
+        execute_values(writer, """
+            UPDATE game_moves AS m SET position_key = v.key, position = v.pos
+            FROM (VALUES %s) AS v(id, key, pos)
+            WHERE m.id = v.id
+        """, updates)
+        migrated += len(updates)
+        print(f"Migrated {migrated} rows")
+    reader.close()
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_moves_position_key ON game_moves(position_key);")
+    if drop_fen:
+        cursor.execute("ALTER TABLE game_moves DROP COLUMN position_before, DROP COLUMN position_after")
+    conn.commit()
+    
+    if drop_fen:
+        # dropped columns only give space back after a rewrite
+        conn.autocommit = True
+        cursor.execute("VACUUM FULL game_moves")
+    cursor.execute("SELECT pg_total_relation_size('game_moves')")
+    size_after = cursor.fetchone()[0]
+    
+    writer.close()
+    cursor.close()
+    conn.close()
+    print(f"Migrated {migrated} rows in {time.perf_counter() - t0:.1f}s")
+    print(f"game_moves: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+
+def find_moves_at_position(fen):
+    """All stored moves played from the given position, looked up by Zobrist key"""
+    board = chess.Board(fen)
+    
+    conn = psycopg2.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT game_id, move_number, player_color, move_san, position, is_teoriat_move
+        FROM game_moves
+        WHERE position_key = %s
+    """, (zobrist_key(board),))
+    # compare the stored position too, so a hash collision can't return a wrong one
+    rows = [r[:4] + (r[5],) for r in cursor.fetchall() if same_position(r[4], board)]
+    cursor.close()
+    conn.close()
+    return rows
+
 def fix_existing_winner_data():
     """Fix any games with missing winner data"""
     conn = psycopg2.connect(**DB_CONFIG)
@@ -420,6 +510,9 @@ if __name__ == "__main__":
     # 1. Create all tables
     create_tables()
     
+    # 1b. Convert rows stored with the old FEN columns
+    migrate_position_columns()
+    
     # 2. Fetch games from Chess.com
     fetch_games()
     
@@ -0,0 +1,93 @@
+"""Training loop shared by the offline jobs, ported from the RNN_model notebook"""
+
+import numpy as np
+import torch
+from torch.utils.data import TensorDataset
+
+from .app import MAX_SEQ_LEN, PAD_TOKEN
+from .corpus import history_window
+
+# notebook hyperparameters
+BATCH_SIZE = 64
+NUM_EPOCHS = 25
+LEARNING_RATE = 0.0003
+WEIGHT_DECAY = 0.01
+MAX_LR = 0.001
+
+
+def make_examples(
+    token_games: list[list[tuple[int, int, int]]],
+    board_features: list[np.ndarray] | None = None,
+    seq_len: int = MAX_SEQ_LEN,
+) -> TensorDataset:
+    """Every (6-token window -> next move id) pair, as the notebook's chessdataset builds them.
+
+    With board_features (features.game_features per game) each example also
+    carries the encoded position it moves from, between theory and the target.
+    seq_len widens the window for models that read more history (a transformer).
+    """
+    colors, moves, theory, targets, rows = [], [], [], [], []
+    for g, tokens in enumerate(token_games):
+        if board_features is not None:
+            rows.append(board_features[g][1 : len(tokens)])
+        for j in range(1, len(tokens)):
+            c, m, t = history_window(tokens, j, seq_len, PAD_TOKEN)
+            colors.append(c)
+            moves.append(m)
+            theory.append(t)
+            targets.append(tokens[j][1])
+    inputs = [
+        torch.tensor(colors, dtype=torch.long).reshape(-1, seq_len),
+        torch.tensor(moves, dtype=torch.long).reshape(-1, seq_len),
+        torch.tensor(theory, dtype=torch.long).reshape(-1, seq_len),
+    ]
+    if board_features is not None:
+        # uint8 0/1 planes; the model casts them to float per batch
+        inputs.append(torch.from_numpy(np.concatenate(rows)))
+    return TensorDataset(*inputs, torch.tensor(targets, dtype=torch.long))
+
+
+def train_epoch(model, dataloader, optimizer, loss_func, device, scheduler=None) -> tuple[float, float]:
+    model.train()
+    total_loss = 0.0
+    correct = 0
+    total = 0
+
+    # batches are (colors, moves, theory[, boards], targets)
+    for *inputs, targets in dataloader:
+        inputs = [x.to(device) for x in inputs]
+        targets = targets.to(device)
+
+        optimizer.zero_grad()
+        logits = model(*inputs)
+        loss = loss_func(logits, targets)
+        loss.backward()
+
+        # Clip gradients to prevent instability
+        torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+        optimizer.step()
+        if scheduler is not None:
+            scheduler.step()
+
+        total_loss += loss.item()
+        correct += (logits.argmax(dim=1) == targets).sum().item()
+        total += targets.size(0)
+
+    return total_loss / max(1, len(dataloader)), correct / max(1, total)
+
+
+def validate(model, dataloader, loss_func, device) -> tuple[float, float]:
+    model.eval()
+    total_loss = 0.0
+    correct = 0
+    total = 0
+
+    with torch.no_grad():
+        for *inputs, targets in dataloader:
+            targets = targets.to(device)
+            logits = model(*(x.to(device) for x in inputs))
+            total_loss += loss_func(logits, targets).item()
+            correct += (logits.argmax(dim=1) == targets).sum().item()
+            total += targets.size(0)
+
+    return total_loss / max(1, len(dataloader)), correct / max(1, total)
@@ -0,0 +1,391 @@
+"""Causal transformer move model with per-game key/value caches
+
+ChessTransformer reads the same (colors, moves, theory) token triples as
+ChessRNN, but over the whole game (up to max_len plies) instead of the last
+MAX_SEQ_LEN. `forward` has ChessRNN's signature and returns next-move logits
+for the last position of each (left-padded) row, so profiles load it as they
+load ChessRNN; evaluate and selfplay build windows of the profile's context_len.
+
+For serving, KVSessions keeps each game's per-layer keys and values, keyed by
+the token history they encode. A request that extends a cached game (the
+engine's last move plus the reply) runs only the new tokens through the
+network. A game longer than max_len slides its window, which shifts every
+position, so from then on each request recomputes.
+
+Training is next-move prediction at every ply of every game (teacher forcing
+under the causal mask), holding out the most recent games:
+    python -m src.transformer --epochs 10 --out src/checkpoints/transformer.pth
+The saved state_dict loads through app.model_from_state like a ChessRNN one.
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import torch
+import torch.nn.functional as F
+
+from .position_token import MAX_WINDOW
+
+D_MODEL = 128
+N_HEADS = 4
+N_LAYERS = 4
+FF_DIM = 512
+MAX_LEN = 240  # plies of context; at most position_token.MAX_WINDOW
+DROPOUT = 0.1
+KV_CACHE_BYTES = 128 * 1024 * 1024
+
+
+class _Block(torch.nn.Module):
+    def __init__(self, d_model: int, n_heads: int, ff_dim: int, dropout: float):
+        super().__init__()
+        self.n_heads = n_heads
+        self.ln1 = torch.nn.LayerNorm(d_model)
+        self.qkv = torch.nn.Linear(d_model, 3 * d_model)
+        self.proj = torch.nn.Linear(d_model, d_model)
+        self.ln2 = torch.nn.LayerNorm(d_model)
+        self.ff = torch.nn.Sequential(
+            torch.nn.Linear(d_model, ff_dim),
+            torch.nn.GELU(),
+            torch.nn.Linear(ff_dim, d_model),
+        )
+        self.dropout = torch.nn.Dropout(dropout)
+
+    def forward(self, x, mask, past=None):
+        b, t, d = x.shape
+        q, k, v = self.qkv(self.ln1(x)).split(d, dim=2)
+        q, k, v = (z.view(b, t, self.n_heads, d // self.n_heads).transpose(1, 2) for z in (q, k, v))
+        if past is not None:
+            k = torch.cat([past[0], k], dim=2)
+            v = torch.cat([past[1], v], dim=2)
+        p = self.dropout.p if self.training else 0.0
+        a = F.scaled_dot_product_attention(q, k, v, attn_mask=mask, dropout_p=p)
+        x = x + self.dropout(self.proj(a.transpose(1, 2).reshape(b, t, d)))
+        x = x + self.dropout(self.ff(self.ln2(x)))
+        return x, (k, v)
+
+
+@dataclass
+class KVCache:
+    """One game's keys/values for every layer, and the tokens they encode"""
+
+    tokens: tuple = ()
+    layers: list = field(default_factory=list)
+    logits: torch.Tensor | None = None  # next-move logits after the last token
+
+    @property
+    def nbytes(self) -> int:
+        return sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in self.layers)
+
+
+class ChessTransformer(torch.nn.Module):
+    def __init__(
+        self,
+        vocab_size: int,
+        pad_token: int,
+        d_model: int = D_MODEL,
+        n_heads: int = N_HEADS,
+        n_layers: int = N_LAYERS,
+        ff_dim: int = FF_DIM,
+        max_len: int = MAX_LEN,
+        dropout: float = DROPOUT,
+    ):
+        super().__init__()
+        self.pad_token = pad_token
+        self.max_len = max_len
+        # saved with the weights: the head count is the one hyperparameter shapes don't reveal
+        self.register_buffer("heads", torch.tensor(n_heads))
+        self.move_embedding = torch.nn.Embedding(vocab_size, d_model, padding_idx=pad_token)
+        self.color_embedding = torch.nn.Embedding(2, d_model)
+        self.theory_embedding = torch.nn.Embedding(2, d_model)
+        self.pos_embedding = torch.nn.Embedding(max_len, d_model)
+        self.blocks = torch.nn.ModuleList(_Block(d_model, n_heads, ff_dim, dropout) for _ in range(n_layers))
+        self.norm = torch.nn.LayerNorm(d_model)
+        self.dropout = torch.nn.Dropout(dropout)
+        self.fc = torch.nn.Linear(d_model, vocab_size)
+
+    def _embed(self, colors, moves, theory, positions):
+        x = (
+            self.move_embedding(moves)
+            + self.color_embedding(colors)
+            + self.theory_embedding(theory)
+            + self.pos_embedding(positions)
+        )
+        return self.dropout(x)
+
+    def forward_all(self, colors, moves, theory):
+        """Logits at every position [B, T, V]; pads may sit on either side"""
+        t = moves.shape[1]
+        real = moves != self.pad_token
+        # left padding: a row's first real token is position 0
+        positions = (real.long().cumsum(dim=1) - 1).clamp(min=0, max=self.max_len - 1)
+        causal = torch.ones(t, t, dtype=torch.bool, device=moves.device).tril()
+        # every query sees itself, so an all-pad row (start position) stays finite
+        mask = (causal & real[:, None, None, :]) | torch.eye(t, dtype=torch.bool, device=moves.device)
+
+        x = self._embed(colors, moves, theory, positions)
+        for block in self.blocks:
+            x, _ = block(x, mask)
+        return self.fc(self.norm(x))
+
+    def forward(self, colors, moves, theory):
+        # ChessRNN-compatible: logits for the move after the last token of each row
+        return self.forward_all(colors, moves, theory)[:, -1, :]
+
+    @torch.no_grad()
+    def extend(self, cache: KVCache, tokens: list[tuple[int, int, int]]) -> KVCache:
+        """New cache with `tokens` appended; only the new tokens are computed"""
+        past = len(cache.tokens)
+        n = len(tokens)
+        device = self.fc.weight.device
+        colors = torch.tensor([[c for c, _, _ in tokens]], device=device)
+        moves = torch.tensor([[m for _, m, _ in tokens]], device=device)
+        theory = torch.tensor([[th for _, _, th in tokens]], device=device)
+        positions = torch.arange(past, past + n, device=device).unsqueeze(0)
+
+        mask = None
+        if n > 1:
+            # new query i sees all cached keys and new keys up to itself
+            mask = torch.ones(n, past + n, dtype=torch.bool, device=device).tril(diagonal=past)
+
+        x = self._embed(colors, moves, theory, positions)
+        layers = []
+        for i, block in enumerate(self.blocks):
+            x, kv = block(x, mask, cache.layers[i] if cache.layers else None)
+            layers.append(kv)
+        logits = self.fc(self.norm(x[:, -1, :]))
+        return KVCache(tokens=cache.tokens + tuple(tokens), layers=layers, logits=logits)
+
+
+def transformer_from_state(state: dict, pad_token: int) -> ChessTransformer:
+    max_len = state["pos_embedding.weight"].shape[0]
+    if max_len > MAX_WINDOW:
+        raise ValueError(f"transformer context of {max_len} plies does not fit a position token (max {MAX_WINDOW})")
+    d_model = state["pos_embedding.weight"].shape[1]
+    n_layers = sum(1 for k in state if k.startswith("blocks.") and k.endswith(".qkv.weight"))
+    net = ChessTransformer(
+        vocab_size=state["fc.weight"].shape[0],
+        pad_token=pad_token,
+        d_model=d_model,
+        n_heads=int(state["heads"]),
+        n_layers=n_layers,
+        ff_dim=state["blocks.0.ff.0.weight"].shape[0],
+        max_len=max_len,
+    )
+    net.load_state_dict(state)
+    net.eval()
+    return net
+
+
+class KVSessions:
+    """LRU of per-game KV caches for one model, bounded by bytes.
+
+    Entries are keyed by the exact token history. A request whose history
+    starts with a cached game (normally that game plus the engine's move and
+    the reply) extends it and replaces it.
+    """
+
+    PREFIX_TRIES = 4  # how many plies back to look for a cached prefix
+
+    def __init__(self, model: ChessTransformer, max_bytes: int = KV_CACHE_BYTES):
+        self.model = model
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._games: "OrderedDict[tuple, KVCache]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.tokens_computed = 0
+
+    def logits(self, window: tuple[list[int], list[int], list[int]]) -> torch.Tensor:
+        colors, moves, theory = window
+        tokens = tuple((c, m, t) for c, m, t in zip(colors, moves, theory) if m != self.model.pad_token)
+        tokens = tokens[-self.model.max_len :]
+
+        with self._lock:
+            base = None
+            for back in range(0, min(self.PREFIX_TRIES, len(tokens)) + 1):
+                base = self._games.get(tokens[: len(tokens) - back])
+                if base is not None:
+                    self._drop(base.tokens)
+                    break
+
+        if base is not None and len(base.tokens) == len(tokens) and base.logits is not None:
+            cache = base
+        elif base is not None and base.tokens:
+            cache = self.model.extend(base, list(tokens[len(base.tokens) :]))
+        else:
+            cache = None
+
+        if cache is None:
+            if tokens:
+                cache = self.model.extend(KVCache(), list(tokens))
+            else:
+                # start position: no history to cache
+                with self._lock:
+                    self.misses += 1
+                device = self.model.fc.weight.device
+                pad = torch.tensor([[self.model.pad_token]], device=device)
+                zero = torch.zeros_like(pad)
+                with torch.no_grad():
+                    return self.model(zero, pad, zero)
+            computed, hit = len(tokens), False
+        else:
+            computed, hit = len(tokens) - len(base.tokens), True
+
+        # counters are read by stats() from other threads, so they move with the LRU
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.tokens_computed += computed
+            self._put(cache)
+        return cache.logits
+
+    def _drop(self, key: tuple):
+        cache = self._games.pop(key, None)
+        if cache is not None:
+            self._bytes -= cache.nbytes
+
+    def _put(self, cache: KVCache):
+        self._drop(cache.tokens)
+        self._games[cache.tokens] = cache
+        self._bytes += cache.nbytes
+        while self._bytes > self.max_bytes and len(self._games) > 1:
+            _, old = self._games.popitem(last=False)
+            self._bytes -= old.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "games": len(self._games),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "tokens_computed": self.tokens_computed,
+            }
+
+
+def make_sequences(token_games: list[list[tuple[int, int, int]]], max_len: int, pad_token: int):
+    """Right-padded (colors, moves, theory, targets); targets[i] is the move after token i, -100 = none"""
+    n = len(token_games)
+    colors = torch.zeros(n, max_len, dtype=torch.long)
+    moves = torch.full((n, max_len), pad_token, dtype=torch.long)
+    theory = torch.zeros(n, max_len, dtype=torch.long)
+    targets = torch.full((n, max_len), -100, dtype=torch.long)
+    for i, tokens in enumerate(token_games):
+        tokens = tokens[: max_len + 1]
+        for j, (c, m, t) in enumerate(tokens[:max_len]):
+            colors[i, j], moves[i, j], theory[i, j] = c, m, t
+        for j in range(len(tokens) - 1):
+            targets[i, j] = tokens[j + 1][1]
+    return torch.utils.data.TensorDataset(colors, moves, theory, targets)
+
+
+def run_epoch(model, loader, device, optimizer=None, scheduler=None) -> tuple[float, float]:
+    training = optimizer is not None
+    model.train(training)
+    total_loss, correct, total = 0.0, 0, 0
+    with torch.set_grad_enabled(training):
+        for colors, moves, theory, targets in loader:
+            colors, moves, theory, targets = (z.to(device) for z in (colors, moves, theory, targets))
+            logits = model.forward_all(colors, moves, theory)
+            loss = F.cross_entropy(logits.reshape(-1, logits.shape[-1]), targets.reshape(-1), ignore_index=-100)
+            if training:
+                optimizer.zero_grad()
+                loss.backward()
+                torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
+                optimizer.step()
+                if scheduler is not None:
+                    scheduler.step()
+            valid = targets != -100
+            total_loss += loss.item()
+            correct += ((logits.argmax(dim=2) == targets) & valid).sum().item()
+            total += valid.sum().item()
+    return total_loss / max(1, len(loader)), correct / max(1, total)
+
+
+def main(argv: list[str] | None = None):
+    from . import app as engine
+    from .corpus import BASE_DIR, load_games, plies_to_tokens
+    from .training import MAX_LR, NUM_EPOCHS, WEIGHT_DECAY
+
+    parser = argparse.ArgumentParser(description="Train the full-context transformer move model")
+    parser.add_argument("--epochs", type=int, default=NUM_EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=16, help="games per batch")
+    parser.add_argument("--max-len", type=int, default=MAX_LEN)
+    parser.add_argument("--d-model", type=int, default=D_MODEL)
+    parser.add_argument("--layers", type=int, default=N_LAYERS)
+    parser.add_argument("--holdout", type=float, default=0.1)
+    parser.add_argument("--out", type=Path, default=BASE_DIR / "checkpoints" / "transformer.pth")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    if not 1 <= args.max_len <= MAX_WINDOW:
+        parser.error(f"--max-len must be between 1 and {MAX_WINDOW}: position tokens store it in one byte")
+
+    torch.manual_seed(args.seed)
+    device = engine.device
+    games = [plies_to_tokens(p, engine.move_to_number, engine.PAD_TOKEN) for _, p in load_games()]
+    split = int(len(games) * (1 - args.holdout))
+    train_ds = make_sequences(games[:split], args.max_len, engine.PAD_TOKEN)
+    val_ds = make_sequences(games[split:], args.max_len, engine.PAD_TOKEN)
+    train_loader = torch.utils.data.DataLoader(train_ds, batch_size=args.batch_size, shuffle=True)
+    val_loader = torch.utils.data.DataLoader(val_ds, batch_size=args.batch_size * 4)
+
+    model = ChessTransformer(
+        vocab_size=engine.default_profile.model.fc.out_features,
+        pad_token=engine.PAD_TOKEN,
+        d_model=args.d_model,
+        n_layers=args.layers,
+        max_len=args.max_len,
+    ).to(device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=MAX_LR, weight_decay=WEIGHT_DECAY)
+    scheduler = torch.optim.lr_scheduler.OneCycleLR(
+        optimizer, max_lr=MAX_LR, epochs=args.epochs, steps_per_epoch=len(train_loader), pct_start=0.1
+    )
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    best_val_acc, history = 0.0, []
+    t0 = time.perf_counter()
+    for epoch in range(args.epochs):
+        train_loss, train_acc = run_epoch(model, train_loader, device, optimizer, scheduler)
+        val_loss, val_acc = run_epoch(model, val_loader, device)
+        history.append(
+            {
+                "epoch": epoch + 1,
+                "train_loss": train_loss,
+                "train_acc": train_acc,
+                "val_loss": val_loss,
+                "val_acc": val_acc,
+            }
+        )
+        print(
+            f"Epoch {epoch + 1}/{args.epochs} | Train Loss: {train_loss:.4f}, Acc: {train_acc:.3f}"
+            f" | Val Loss: {val_loss:.4f}, Acc: {val_acc:.3f}"
+        )
+        if val_acc > best_val_acc:
+            best_val_acc = val_acc
+            torch.save(model.state_dict(), args.out)
+
+    print(
+        json.dumps(
+            {
+                "best_val_acc": best_val_acc,
+                "parameters": sum(p.numel() for p in model.parameters()),
+                "wall_seconds": time.perf_counter() - t0,
+                "history": history,
+                "out": str(args.out),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Warm-start cache of precomputed /move decisions for frequent positions
+
+`python -m src.warm_cache` walks the games, counts (position, model window)
+pairs, and for the most frequent ones runs the model and the scoring pass of
+pick_legal_move once. The scored candidate lists go into one file that the
+server memory-maps at startup. A hit then only re-samples (and adds
+repetition_penalty, which depends on history outside the key).
+
+File layout (little-endian):
+
+    header   magic "TWRM", format version, vocab / weights / scoring versions, entry count
+    keys     n x uint64, sorted: blake2b-64 of (Zobrist key, packed window)
+    offsets  n x uint32 into the entry area
+    entries  Zobrist u64, window (u16 ids, colour and theory bitfields),
+             candidate count u8, then per candidate: move u16, score f32
+
+The versions are crc32s of the vocab, the weights file and the scoring
+constants; a cache built for anything else is ignored. Entries are the teacher's
+full-tier decisions: /move uses them for every quality tier (a hit is cheaper
+than the cheapest one) but not in modes served by a distilled student.
+
+Example:
+    python -m src.warm_cache --top 5000 --min-count 2
+"""
+
+import argparse
+import hashlib
+import mmap
+import struct
+import time
+from collections import Counter
+from pathlib import Path
+
+import chess
+import chess.polyglot
+import numpy as np
+
+from .position_token import pack_move, pack_window, unpack_move
+
+MAGIC = b"TWRM"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHIIII")
+HEADER_BYTES = 32  # padded so the uint64 keys stay aligned
+CANDIDATE = struct.Struct("<Hf")
+MAX_CANDIDATES = 255
+TOP_WINDOWS = 5000
+MIN_COUNT = 2
+
+
+def entry_key(zobrist: int, packed_window: bytes) -> int:
+    digest = hashlib.blake2b(struct.pack("<Q", zobrist) + packed_window, digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class WarmCache:
+    """Read-only view of a cache file; lookups binary-search the mapped key array"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, self.vocab_version, self.weights_version, self.scoring_version, n = HEADER.unpack_from(
+            self._mm, 0
+        )
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a warm cache (format {FORMAT_VERSION})")
+        self.entries = n
+        self._keys = np.frombuffer(self._mm, dtype="<u8", count=n, offset=HEADER_BYTES)
+        self._offsets = np.frombuffer(self._mm, dtype="<u4", count=n, offset=HEADER_BYTES + 8 * n)
+        self._data = HEADER_BYTES + 12 * n
+        self.hits = 0
+        self.misses = 0
+
+    def matches(self, vocab_version: int, weights_version: int, scoring_version: int) -> bool:
+        return (self.vocab_version, self.weights_version, self.scoring_version) == (
+            vocab_version,
+            weights_version,
+            scoring_version,
+        )
+
+    def lookup(
+        self, board: chess.Board, window: tuple[list[int], list[int], list[int]]
+    ) -> list[tuple[chess.Move, float]] | None:
+        """Scored candidates (best first, without repetition_penalty) or None on a miss"""
+        zobrist = chess.polyglot.zobrist_hash(board)
+        packed = pack_window(window)
+        key = np.uint64(entry_key(zobrist, packed))
+        i = int(np.searchsorted(self._keys, key))
+        if i >= self.entries or self._keys[i] != key:
+            self.misses += 1
+            return None
+
+        off = self._data + int(self._offsets[i])
+        stored_zobrist = struct.unpack_from("<Q", self._mm, off)[0]
+        off += 8
+        if stored_zobrist != zobrist or self._mm[off : off + len(packed)] != packed:
+            self.misses += 1  # 64-bit key collision
+            return None
+        off += len(packed)
+        n = self._mm[off]
+        off += 1
+        out = []
+        for j in range(n):
+            mv, score = CANDIDATE.unpack_from(self._mm, off + j * CANDIDATE.size)
+            out.append((unpack_move(mv), score))
+        self.hits += 1
+        return out
+
+    def stats(self) -> dict:
+        return {"path": str(self.path), "entries": self.entries, "hits": self.hits, "misses": self.misses}
+
+
+def write_cache(
+    path: Path,
+    entries: list[tuple[int, bytes, list[tuple[chess.Move, float]]]],
+    vocab_version: int,
+    weights_version: int,
+    scoring_version: int,
+):
+    """entries: (unsigned Zobrist key, packed window, scored candidates)"""
+    keyed = sorted(((entry_key(z, w), z, w, scored) for z, w, scored in entries), key=lambda e: e[0])
+    keys, offsets, blobs = [], [], []
+    off = 0
+    for key, zobrist, packed, scored in keyed:
+        scored = scored[:MAX_CANDIDATES]
+        blob = b"".join(
+            [
+                struct.pack("<Q", zobrist),
+                packed,
+                bytes([len(scored)]),
+                *(CANDIDATE.pack(pack_move(mv), score) for mv, score in scored),
+            ]
+        )
+        keys.append(key)
+        offsets.append(off)
+        blobs.append(blob)
+        off += len(blob)
+
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, vocab_version, weights_version, scoring_version, len(keyed))
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("wb") as f:
+        f.write(header.ljust(HEADER_BYTES, b"\0"))
+        f.write(np.asarray(keys, dtype="<u8").tobytes())
+        f.write(np.asarray(offsets, dtype="<u4").tobytes())
+        f.write(b"".join(blobs))
+    # readers map the file, so swap it in whole
+    tmp.replace(path)
+
+
+def frequent_windows(games: list[list[str]], profile, top: int, min_count: int) -> list[tuple[list[str], int]]:
+    """(uci prefix, count) of the most common (position, window) pairs, most common first"""
+    from . import app as engine
+
+    counts: Counter[tuple[int, bytes]] = Counter()
+    first: dict[tuple[int, bytes], tuple[int, int]] = {}
+    for gi, uci_moves in enumerate(games):
+        board = chess.Board()
+        colors: list[int] = []
+        moves: list[int] = []
+        theory: list[int] = []
+        for ply, uci in enumerate(uci_moves):
+            window = engine.pad_window(colors, moves, theory, profile.context_len)
+            key = (chess.polyglot.zobrist_hash(board), pack_window(window))
+            counts[key] += 1
+            first.setdefault(key, (gi, ply))
+
+            mv = chess.Move.from_uci(uci)
+            if mv not in board.legal_moves:
+                break
+            color, move_idx, th = engine.encode_move(board, mv, profile)
+            colors.append(color)
+            moves.append(move_idx)
+            theory.append(th)
+            board.push(mv)
+
+    out = []
+    for key, n in counts.most_common(top):
+        if n < min_count:
+            break
+        gi, ply = first[key]
+        out.append((games[gi][:ply], n))
+    return out
+
+
+def build(games: list[list[str]], out: Path, top: int, min_count: int, batch: int = 256) -> dict:
+    from . import app as engine
+
+    profile = engine.default_profile
+    t0 = time.perf_counter()
+    picked = frequent_windows(games, profile, top, min_count)
+    positions = sum(len(g) for g in games)
+
+    entries = []
+    covered = 0
+    for i in range(0, len(picked), batch):
+        chunk = picked[i : i + batch]
+        prepared = [(engine.board_and_window(uci, profile), n) for uci, n in chunk]
+        # positions the book answers never reach the model, so they need no entry
+        prepared = [
+            ((b, w), n)
+            for (b, w), n in prepared
+            if not b.is_game_over() and engine.try_book_move(b, profile.book_path) is None
+        ]
+        if not prepared:
+            continue
+        logits = engine.model_logits_batch(
+            [w for (_, w), _ in prepared], profile, boards=[b for (b, _), _ in prepared]
+        )
+        for k, ((board, window), n) in enumerate(prepared):
+            scored = engine.score_candidates(board, logits[k : k + 1], profile=profile, repetition=False)
+            if scored:
+                entries.append((chess.polyglot.zobrist_hash(board), pack_window(window), scored))
+                covered += n
+
+    write_cache(out, entries, profile.vocab_version, profile.weights_version, engine.SCORING_VERSION)
+    build_seconds = time.perf_counter() - t0
+
+    # serve-time cost: cache hit vs the model + scoring pass it replaces
+    cache = WarmCache(out)
+    sample = [engine.board_and_window(uci, profile) for uci, _ in picked[:200]]
+    t1 = time.perf_counter()
+    for board, window in sample:
+        cache.lookup(board, window)
+    hit_us = (time.perf_counter() - t1) / max(1, len(sample)) * 1e6
+    t1 = time.perf_counter()
+    for board, window in sample:
+        if not board.is_game_over():
+            engine.score_candidates(board, engine.serve_logits(board, window, profile), profile=profile)
+    miss_us = (time.perf_counter() - t1) / max(1, len(sample)) * 1e6
+
+    return {
+        "games": len(games),
+        "positions": positions,
+        "entries": len(entries),
+        "file_bytes": out.stat().st_size,
+        "position_coverage": covered / positions if positions else 0.0,
+        "build_seconds": build_seconds,
+        "lookup_us": hit_us,
+        "model_and_scoring_us": miss_us,
+        "out": str(out),
+    }
+
+
+def main(argv: list[str] | None = None):
+    from . import app as engine
+    from .corpus import load_games, load_games_from_db, plies_to_uci
+
+    parser = argparse.ArgumentParser(description="Build the /move warm-start cache")
+    parser.add_argument("--source", choices=("csv", "db"), default="csv")
+    parser.add_argument("--top", type=int, default=TOP_WINDOWS, help="most frequent windows to precompute")
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT)
+    parser.add_argument("--out", type=Path, default=engine.WARM_CACHE_PATH)
+    args = parser.parse_args(argv)
+
+    games = load_games_from_db() if args.source == "db" else load_games()
+    report = build([plies_to_uci(p) for _, p in games], args.out, args.top, args.min_count)
+    print(
+        f"Wrote {report['entries']} entries ({report['file_bytes']:,} B) to {report['out']}"
+        f" covering {report['position_coverage']:.1%} of {report['positions']:,} corpus positions"
+    )
+    print(f"Hit {report['lookup_us']:.0f}us vs model + scoring {report['model_and_scoring_us']:.0f}us")
+
+
+if __name__ == "__main__":
+    main()